@@ -12,7 +12,10 @@ class SystemStoreConfig(BaseSettings):
     postgres_database: str = Field("air_supply_db", description="Database name")
     postgres_table: str = Field("air_supply_system_table", description="Database table for system settings")
     pool_min_size: int = Field(1, description="Minimum connection pool size")
-    pool_max_size: int = Field(10, description="Maximum connection pool size")
+    pool_max_size: int = Field(50, description="Maximum connection pool size")
+    pool_max_inactive_connection_lifetime: float = Field(300.0, description="Seconds an idle pooled connection is kept before closing")
+    statement_cache_size: int = Field(1024, description="Size of asyncpg's per-connection prepared statement cache")
+    command_timeout: float = Field(30.0, description="Default timeout in seconds for a single query")
 
     class Config:
         case_sensitive = False
@@ -1,102 +1,231 @@
 from .config import SystemStoreConfig
 
+import asyncio
 import asyncpg
-from typing import Optional, Dict, Any
-import json
+import weakref
+from typing import Optional, Dict, Any, List, Tuple
+import orjson
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _SharedPool:
+    """A pool being created or open, with the number of stores using it."""
+    def __init__(self, pool: "asyncio.Future[asyncpg.Pool]"):
+        self.pool = pool
+        self.refs = 0
+
+
+# Stores connected to the same database with the same pool settings from the same event loop share
+# one pool, so each repository does not pay for its own connections. The loops are held weakly,
+# so the entries of a loop are dropped with it.
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Any, ...], _SharedPool]]" = weakref.WeakKeyDictionary()
+
 
 class SystemStore:
     def __init__(self, config: Optional[SystemStoreConfig] = None):
         self.config = config if config is not None else SystemStoreConfig()
         self.pool: Optional[asyncpg.Pool] = None
+        # Loop and settings the shared pool is registered under, None for a pool passed in through from_pool
+        self._pool_loop: Optional["weakref.ref[asyncio.AbstractEventLoop]"] = None
+        self._pool_key: Optional[Tuple[Any, ...]] = None
         self.dsn = f"postgresql://{self.config.postgres_user}:{self.config.postgres_password}@{self.config.postgres_host}:{self.config.postgres_port}/{self.config.postgres_database}"
         self.store_table = self.config.postgres_table
         self.pool_min = self.config.pool_min_size
         self.pool_max = self.config.pool_max_size
+        self.pool_max_inactive_lifetime = self.config.pool_max_inactive_connection_lifetime
+        self.statement_cache_size = self.config.statement_cache_size
+        self.command_timeout = self.config.command_timeout
 
+        # The table name is fixed for the store's lifetime, so format every query once
+        self._q_create = f"""
+            CREATE TABLE IF NOT EXISTS {self.store_table} (
+                id SERIAL PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                value JSONB NOT NULL
+            )
+        """
+        self._q_drop = f"DROP TABLE IF EXISTS {self.store_table}"
+        self._q_insert = f"INSERT INTO {self.store_table} (key, value) VALUES ($1, $2)"
+        self._q_upsert = f"INSERT INTO {self.store_table} (key, value) VALUES ($1, $2) ON CONFLICT (key) DO UPDATE SET value = $2"
+        self._q_select = f"SELECT value FROM {self.store_table} WHERE key = $1"
+        self._q_select_many = f"SELECT key, value FROM {self.store_table} WHERE key = ANY($1::text[])"
+        self._q_delete = f"DELETE FROM {self.store_table} WHERE key = $1"
+
+    @classmethod
+    async def from_pool(cls, pool: asyncpg.Pool, config: Optional[SystemStoreConfig] = None) -> "SystemStore":
+        """
+        Create a store on a pool owned by the caller, which is left open when the store is closed.
+        The pool's connections should be initialized with `SystemStore._init_connection`.
+        """
+        store = cls(config)
+        store.pool = pool
+        await store._execute(store._q_create)
+        return store
 
     async def connect(self):
         """Initialize the connection pool."""
         try:
-            self.pool = await asyncpg.create_pool(
-                dsn=self.dsn,
-                min_size=self.pool_min,
-                max_size=self.pool_max
-            )
-            print("Database pool connected successfully")
+            self.pool = await self._acquire_pool()
+            logger.info("Database pool connected successfully")
 
             # Create table if not exists
-            await self._execute(f"""
-                CREATE TABLE IF NOT EXISTS {self.store_table} (
-                    id SERIAL PRIMARY KEY,
-                    key TEXT UNIQUE NOT NULL,
-                    value JSONB NOT NULL
-                )
-            """)
+            await self._execute(self._q_create)
         except Exception as e:
-            print(f"Failed to create pool: {e}")
+            logger.error("Failed to create pool: %s", e)
             raise
 
     async def drop(self):
         """Drop the table from the database."""
         try:
-            await self._execute(f"DROP TABLE IF EXISTS {self.store_table}")
-            print(f"Table '{self.store_table}' dropped successfully")
+            # The pool may be shared with other stores, so it is left alone. Statements of this store
+            # cached against the dropped table are re-planned by the server when the table is created
+            # again, or if their result type changed, prepared again by asyncpg on their next use.
+            await self._execute(self._q_drop)
+            logger.info("Table '%s' dropped successfully", self.store_table)
         except Exception as e:
-            print(f"Failed to drop table: {e}")
+            logger.error("Failed to drop table: %s", e)
             raise
 
     async def close(self):
         """Close the connection pool."""
         if self.pool:
-            await self.pool.close()
-            print("Database pool closed")
+            pool, self.pool = self.pool, None
+            if self._pool_key is None:
+                # Passed in through from_pool, the caller closes it
+                return
+            key, self._pool_key = self._pool_key, None
+            loop = self._pool_loop()
+            loop_pools = _pools.get(loop) if loop is not None else None
+            shared = loop_pools.get(key) if loop_pools is not None else None
+            if shared is not None:
+                shared.refs -= 1
+                if shared.refs > 0:
+                    return
+                del loop_pools[key]
+            # Last store using the pool
+            await pool.close()
+            logger.info("Database pool closed")
 
     async def add_item(self, key: str, value: Dict[str, Any]):
         """Add an item to the database."""
-        query = f"INSERT INTO {self.store_table} (key, value) VALUES ($1, $2)"
-        value_json = json.dumps(value)
-        await self._execute(query, key, value_json)
+        await self._execute(self._q_insert, key, value)
+
+    async def add_items(self, items: Dict[str, Dict[str, Any]]):
+        """Add several items to the database in a single batch."""
+        if not items:
+            return
+        await self._executemany(self._q_insert, list(items.items()))
 
     async def upsert_item(self, key: str, value: Dict[str, Any]):
         """Upsert an item in the database."""
-        query = f"""
-            INSERT INTO {self.store_table} (key, value) VALUES ($1, $2)
-            ON CONFLICT (key) DO UPDATE SET value = $2
-        """
-        value_json = json.dumps(value)
-        await self._execute(query, key, value_json)
+        await self._execute(self._q_upsert, key, value)
+
+    async def upsert_items(self, items: Dict[str, Dict[str, Any]]):
+        """Upsert several items in the database in a single batch."""
+        if not items:
+            return
+        await self._executemany(self._q_upsert, list(items.items()))
 
     async def get_item(self, key: str) -> Optional[Dict[str, Any]]:
-        query = f"SELECT value FROM {self.store_table} WHERE key = $1"
-        result = await self._fetch(query, key)
-        if result:
-            return json.loads(result[0]["value"])
-        return None
+        # value is NOT NULL, so None means the key does not exist
+        return await self._fetchval(self._q_select, key)
+
+    async def get_items(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several items from the database in a single query, keys that do not exist are left out."""
+        if not keys:
+            return {}
+        rows = await self._fetch(self._q_select_many, list(keys))
+        return {row["key"]: row["value"] for row in rows}
 
     async def delete_item(self, key: str):
-        query = f"DELETE FROM {self.store_table} WHERE key = $1"
-        await self._execute(query, key)
+        await self._execute(self._q_delete, key)
+
+    async def _acquire_pool(self) -> asyncpg.Pool:
+        """Return the pool shared for this database, creating it if no store holds one yet."""
+        loop = asyncio.get_running_loop()
+        loop_pools = _pools.setdefault(loop, {})
+        # Stores with other pool settings get their own pool rather than silently using the first one's
+        key = (self.dsn, self.pool_min, self.pool_max, self.pool_max_inactive_lifetime, self.statement_cache_size, self.command_timeout)
+        shared = loop_pools.get(key)
+        if shared is None:
+            # Registered before awaiting, so concurrent connects wait for the same pool
+            shared = loop_pools[key] = _SharedPool(asyncio.ensure_future(asyncpg.create_pool(
+                dsn=self.dsn,
+                min_size=self.pool_min,
+                max_size=self.pool_max,
+                max_inactive_connection_lifetime=self.pool_max_inactive_lifetime,
+                statement_cache_size=self.statement_cache_size,
+                # The store's queries are fixed, so cached statements never need to expire
+                max_cached_statement_lifetime=0,
+                command_timeout=self.command_timeout,
+                init=self._init_connection
+            )))
+        try:
+            pool = await asyncio.shield(shared.pool)
+        except Exception:
+            if loop_pools.get(key) is shared:
+                del loop_pools[key]
+            raise
+        shared.refs += 1
+        self._pool_loop = weakref.ref(loop)
+        self._pool_key = key
+        return pool
 
+    @staticmethod
+    async def _init_connection(connection: asyncpg.Connection):
+        """Exchange JSONB values in binary format, (de)serialized with orjson."""
+        await connection.set_type_codec(
+            "jsonb",
+            encoder=lambda value: b"\x01" + orjson.dumps(value),
+            decoder=lambda data: orjson.loads(data[1:]),
+            schema="pg_catalog",
+            format="binary"
+        )
+
+    # The pool shortcuts acquire a connection internally, and asyncpg's per-connection statement
+    # cache prepares each of the pre-formatted queries only once per connection
     async def _execute(self, query: str, *args):
         """Execute a query using the pool."""
         if not self.pool:
             raise Exception("Pool not initialized")
-        
-        async with self.pool.acquire() as connection:
-            try:
-                return await connection.execute(query, *args)
-            except Exception as e:
-                print(f"Query execution failed: {e}")
-                raise
+
+        try:
+            return await self.pool.execute(query, *args)
+        except Exception as e:
+            logger.error("Query execution failed: %s", e)
+            raise
+
+    async def _executemany(self, query: str, args: List[Tuple[Any, ...]]):
+        """Execute a query for every set of arguments in a single batch using the pool."""
+        if not self.pool:
+            raise Exception("Pool not initialized")
+
+        try:
+            await self.pool.executemany(query, args)
+        except Exception as e:
+            logger.error("Batch query execution failed: %s", e)
+            raise
 
     async def _fetch(self, query: str, *args):
         """Fetch results from a query using the pool."""
         if not self.pool:
             raise Exception("Pool not initialized")
-        
-        async with self.pool.acquire() as connection:
-            try:
-                return await connection.fetch(query, *args)
-            except Exception as e:
-                print(f"Query fetch failed: {e}")
-                raise
+
+        try:
+            return await self.pool.fetch(query, *args)
+        except Exception as e:
+            logger.error("Query fetch failed: %s", e)
+            raise
+
+    async def _fetchval(self, query: str, *args):
+        """Fetch the first value of the first row of a query using the pool."""
+        if not self.pool:
+            raise Exception("Pool not initialized")
+
+        try:
+            return await self.pool.fetchval(query, *args)
+        except Exception as e:
+            logger.error("Query fetch failed: %s", e)
+            raise
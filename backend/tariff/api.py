@@ -1,14 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from .models import TariffRequest, TariffResponse
 from typing import List, Dict, Any
 from .country_code_repo import CountryCodeRepo
 from .hs_code_repo import HSCodeRepo
 from ..utils.singleton import singleton_cache
+from ..utils.ttl_cache import async_ttl_cache
 from .config import TariffConfig
-import requests
-import xml.etree.ElementTree as ET
+import asyncio
+import bisect
+import httpx
+from io import BytesIO
+from lxml import etree
+import logging
+import re
 import urllib.parse
 
+logger = logging.getLogger(__name__)
+
 
 # Define dependency functions with singleton cache to reuse instances
 @singleton_cache
@@ -20,13 +29,31 @@ def get_tariff_config() -> TariffConfig:
 @singleton_cache
 def get_country_code_repo() -> CountryCodeRepo:
     """Dependency to get CountryCodeRepo instance (singleton)"""
-    return CountryCodeRepo()
+    repo = CountryCodeRepo()
+    # Cached lookups would keep serving the codes of the previous data after a refresh
+    repo.add_change_listener(find_country_code.cache_clear)
+    return repo
 
 @singleton_cache
 def get_hs_code_repo() -> HSCodeRepo:
     """Dependency to get HSCodeRepo instance (singleton)"""
-    return HSCodeRepo()
+    repo = HSCodeRepo()
+    repo.add_change_listener(find_hs_code.cache_clear)
+    return repo
+
+@singleton_cache
+def get_http_client() -> httpx.AsyncClient:
+    """Dependency to get the shared httpx.AsyncClient instance (singleton)"""
+    return httpx.AsyncClient(
+        timeout=10,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+
+# Repeated product descriptions and country names are common, so lookups are cached for an hour
+CODE_LOOKUP_TTL_SECONDS = 60 * 60
 
+@async_ttl_cache(ttl=CODE_LOOKUP_TTL_SECONDS, maxsize=4096)
 async def find_hs_code(
     product_desc: str, 
     hs_code_repo: HSCodeRepo
@@ -45,6 +72,7 @@ async def find_hs_code(
     return result[0]['metadata']["productcode"] if result else "000000", result[0]
 
 
+@async_ttl_cache(ttl=CODE_LOOKUP_TTL_SECONDS, maxsize=1024)
 async def find_country_code(
     country_name: str, 
     is_reporter: bool,
@@ -60,75 +88,229 @@ async def find_country_code(
         The country code as a string.
         Returns "000" if not found.
     """
+    # Canonical country names resolve through an exact-name lookup without an embedding search
+    exact = await country_code_repo.find_exact_country_code(country_name, is_reporter)
+    if exact is not None:
+        return exact["metadata"]["countrycode"], exact
+    
     result = await country_code_repo.find_country_codes(name=country_name, top_k=1, metadata={"isreporter": "1" if is_reporter else "0"})
     return result[0]["metadata"]["countrycode"] if result else "000", result[0]
 
 
-async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, target_year: int, wto_api_key: str) -> tuple[float | None, str]:
+WITS_BASE_URL = "https://wits.worldbank.org/API/V1"
+
+# Compiled once, the XPath expressions are evaluated natively for every availability document
+WITS_NAMESPACES = {'wits': 'http://wits.worldbank.org'}
+_REPORTER_TAG = f"{{{WITS_NAMESPACES['wits']}}}reporter"
+_YEAR_XPATH = etree.XPath('wits:year/text()', namespaces=WITS_NAMESPACES)
+_PARTNERS_XPATH = etree.XPath('wits:partnerlist/text()', namespaces=WITS_NAMESPACES)
+
+# WITS availability changes at most daily, so it is cached per reporter for a day
+WITS_AVAILABILITY_TTL_SECONDS = 24 * 60 * 60
+
+
+class WitsAvailabilityError(Exception):
+    """Raised when the WITS availability data for a reporter cannot be fetched or parsed."""
+
+
+@async_ttl_cache(ttl=WITS_AVAILABILITY_TTL_SECONDS)
+async def get_wits_availability(reporter: str, client: httpx.AsyncClient) -> tuple[dict[int, list[str]], list[int]]:
     """
-    Fetches the tariff rate using WITS API with fallbacks, cross-referencing with WTO API for zero rates or bilateral tariffs.
+    Fetch the years with WITS tariff data for a reporter and the partners available in each year.
     
     Parameters:
     - reporter: str, ISO 3-digit code for reporter country (e.g., '156' for China)
-    - partner: str, ISO 3-digit code for partner country or '000' for World
-    - target_year: str, the target year (e.g., '2024')
-    - hs_code: str, 6-digit HS code (e.g., '851830')
-    - wto_api_key: str, WTO API key for cross-referencing (optional)
+    - client: httpx.AsyncClient, shared client used for the WITS request
     
     Returns:
-    - tuple: (tariff_rate: float or None, reason: str)
+    - tuple: (available: dict of year -> list of partner codes, always including '000' for World,
+              sorted_years: list of the available years in ascending order)
+    
+    Raises:
+    - WitsAvailabilityError: if the data cannot be fetched, parsed or is empty
     """
-    base_url = "https://wits.worldbank.org/API/V1"
-    availability_url = f"{base_url}/wits/datasource/trn/dataavailability/country/{reporter}/year/all"
+    availability_url = f"{WITS_BASE_URL}/wits/datasource/trn/dataavailability/country/{reporter}/year/all"
     
     # Step 1: Fetch WITS availability data
     try:
-        resp = requests.get(availability_url, timeout=10)
+        resp = await client.get(availability_url, timeout=10)
         resp.raise_for_status()
-    except requests.RequestException as e:
-        return None, f"WITS availability check failed: {str(e)}"
+    except httpx.HTTPError as e:
+        raise WitsAvailabilityError(f"WITS availability check failed: {str(e)}")
     
-    # Step 2: Parse XML with WITS namespace and handle UTF-8 BOM
+    # Steps 2-3: Stream-parse the XML (lxml skips the UTF-8 BOM) and extract available years and partners,
+    # discarding each reporter element once processed so memory stays flat for large documents
+    available = {}  # year: list of partners
+    found_reporter = False
     try:
-        xml_content = resp.content.decode('utf-8-sig')  # utf-8-sig automatically skips the BOM
-        root = ET.fromstring(xml_content)
-        namespaces = {'wits': 'http://wits.worldbank.org'}
-    except ET.ParseError as e:
-        return None, f"WITS XML parsing failed: {str(e)}"
+        for _, rep in etree.iterparse(BytesIO(resp.content), tag=_REPORTER_TAG):
+            found_reporter = True
+            year_text = _YEAR_XPATH(rep)
+            partner_text = _PARTNERS_XPATH(rep)
+            rep.clear()
+            while rep.getprevious() is not None:
+                del rep.getparent()[0]
+            
+            if not year_text or not year_text[0]:
+                continue
+            year = int(year_text[0])
+            
+            partners = []
+            if partner_text and partner_text[0]:
+                partners = [p.strip() for p in partner_text[0].split(';') if p.strip()]
+            if '000' not in partners:
+                partners.append('000')
+            available[year] = partners
+    except etree.XMLSyntaxError as e:
+        raise WitsAvailabilityError(f"WITS XML parsing failed: {str(e)}")
     
-    # Step 3: Extract available years and partners
-    available = {}  # year: list of partners
-    reporters = root.findall('.//wits:reporter', namespaces)
-    if not reporters:
-        xml_snippet = ET.tostring(root, encoding='unicode')[:500]
-        return None, f"No reporter elements found in WITS XML. Snippet: {xml_snippet}"
-    
-    for rep in reporters:
-        year_elem = rep.find('wits:year', namespaces)
-        if year_elem is None or not year_elem.text:
-            continue
-        year = int(year_elem.text)
-        
-        partner_elem = rep.find('wits:partnerlist', namespaces)
-        partners = []
-        if partner_elem is not None and partner_elem.text:
-            partners = [p.strip() for p in partner_elem.text.split(';') if p.strip()]
-        if '000' not in partners:
-            partners.append('000')
-        available[year] = partners
+    if not found_reporter:
+        xml_snippet = resp.content[:500].decode('utf-8-sig', errors='replace')
+        raise WitsAvailabilityError(f"No reporter elements found in WITS XML. Snippet: {xml_snippet}")
     
     if not available:
-        return None, "No availability data found in WITS XML response"
+        raise WitsAvailabilityError("No availability data found in WITS XML response")
+    
+    return available, sorted(available)
+
+
+# Case-insensitive name matchers for WTO tariff indicators, compiled once
+_TARIFF_INDICATOR_RE = re.compile(r'tariff|duty|tax', re.IGNORECASE)
+_MFN_AVERAGE_RE = re.compile(r'mfn.*average|average.*mfn', re.IGNORECASE | re.DOTALL)
+
+# WTO rejects dimensions the indicator does not support with one of these messages
+_WTO_DIMENSION_ERROR_RE = re.compile(rb'does not have a (?:partner|product/sector) dimension')
+WTO_ERROR_SNIPPET_BYTES = 512
+
+
+class WtoIndicatorError(Exception):
+    """Raised when no usable WTO tariff indicator can be determined."""
+
+
+# Indicator found per WTO API key. Not keyed on the client, which only carries the request,
+# so a client closed on shutdown is not kept alive by the cache.
+_wto_indicators: Dict[str, tuple[str, dict[str, Any]]] = {}
+
+
+async def get_wto_indicator(wto_api_key: str, client: httpx.AsyncClient) -> tuple[str, dict[str, Any]]:
+    """
+    Find the WTO timeseries indicator to use for tariff cross-referencing.
+    The indicator list is effectively static, so it is fetched and searched once per API key.
+    Failed lookups are not cached.
+    
+    Parameters:
+    - wto_api_key: str, WTO API key
+    - client: httpx.AsyncClient, shared client used for the WTO request
+    
+    Returns:
+    - tuple: (indicator_code: str, tariff_indicator: dict)
+    
+    Raises:
+    - WtoIndicatorError: if the indicators cannot be fetched or none matches
+    """
+    indicator = _wto_indicators.get(wto_api_key)
+    if indicator is None:
+        indicator = _wto_indicators[wto_api_key] = await _fetch_wto_indicator(wto_api_key, client)
+    return indicator
+
+
+async def _fetch_wto_indicator(wto_api_key: str, client: httpx.AsyncClient) -> tuple[str, dict[str, Any]]:
+    """Fetch the WTO indicator list and pick the indicator to use, uncached version of get_wto_indicator."""
+    indicators_url = "https://api.wto.org/timeseries/v1/indicators?i=all&t=all&pc=all&tp=all&frq=all&lang=1"
+    
+    headers = {
+        "Cache-Control": "no-cache",
+        "Ocp-Apim-Subscription-Key": wto_api_key
+    }
+    
+    logger.debug("Fetching available indicators from WTO API...")
+    
+    indicator_code = None
+    tariff_indicator = None
+    
+    try:
+        # Try to get the list of available indicators
+        indicators_resp = await client.get(indicators_url, headers=headers, timeout=10)
+        
+        if indicators_resp.status_code == 200:
+            indicators_data = indicators_resp.json()
+            logger.debug("Got indicators response. Searching for tariff indicators...")
+            
+            # Look for indicators related to tariffs by searching their names
+            # The API returns a list of indicators
+            for ind in indicators_data:
+                if 'code' not in ind or 'name' not in ind:
+                    continue
+                name = ind['name']
+                if not _TARIFF_INDICATOR_RE.search(name):
+                    continue
+                logger.debug("Found potential tariff indicator: %s - %s", ind['code'], name)
+                # Capture all potential tariff indicators
+                # Use the first one we find as fallback
+                if indicator_code is None:
+                    indicator_code = ind['code']
+                    tariff_indicator = ind
+                
+                # Prefer indicators with "MFN" and "average" in the name
+                # These likely represent Most Favored Nation average tariff rates
+                if _MFN_AVERAGE_RE.search(name):
+                    indicator_code = ind['code']
+                    tariff_indicator = ind
+                    break
+    except Exception as e:
+        logger.warning("Error fetching indicators: %s", e)
+        # Can't proceed with WTO API check without valid indicators
+        raise WtoIndicatorError(f"Error fetching indicators from WTO API: {str(e)}")
+    
+    if indicators_resp.status_code != 200:
+        logger.warning("Failed to get indicators: %s, %s", indicators_resp.status_code, indicators_resp.content)
+        # Can't proceed with WTO API check without valid indicators
+        raise WtoIndicatorError(f"Failed to get indicators from WTO API: HTTP {indicators_resp.status_code}")
+    
+    if not indicator_code:
+        logger.warning("No suitable tariff indicator found in the response.")
+        # We can't proceed without an indicator code
+        raise WtoIndicatorError("No suitable tariff indicator found in WTO API response")
+    
+    # Get indicator name from the tariff indicator
+    indicator_name = tariff_indicator.get('name', 'Unknown')
+    logger.info("Using indicator code: %s (%s)", indicator_code, indicator_name)
+    return indicator_code, tariff_indicator
+
+
+async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, target_year: int, wto_api_key: str, client: httpx.AsyncClient, wto_crosscheck: bool = False) -> tuple[float | None, str]:
+    """
+    Fetches the tariff rate using WITS API with fallbacks, cross-referencing with WTO API for zero rates or bilateral tariffs.
+    
+    Parameters:
+    - reporter: str, ISO 3-digit code for reporter country (e.g., '156' for China)
+    - partner: str, ISO 3-digit code for partner country or '000' for World
+    - target_year: str, the target year (e.g., '2024')
+    - hs_code: str, 6-digit HS code (e.g., '851830')
+    - wto_api_key: str, WTO API key for cross-referencing (optional)
+    - client: httpx.AsyncClient, shared client used for all WITS and WTO requests
+    - wto_crosscheck: bool, also cross-reference non-zero bilateral WITS rates with WTO
+    
+    Returns:
+    - tuple: (tariff_rate: float or None, reason: str)
+    """
+    base_url = WITS_BASE_URL
+    
+    # Steps 1-3: Fetch, parse and extract WITS availability data (cached per reporter)
+    try:
+        available, sorted_years = await get_wits_availability(reporter, client)
+    except WitsAvailabilityError as e:
+        return None, str(e)
     
     # Step 4: Select year and partner with fallback
     used_partner = partner
     used_year = None
     reason_parts = []
     
-    sorted_years = sorted(available.keys(), reverse=True)
-    for yr in sorted_years:
-        if yr > int(target_year):
-            continue
+    target_year = int(target_year)
+    # Index of the latest available year not after the target year, then scan backward for the partner
+    latest_index = bisect.bisect_right(sorted_years, target_year) - 1
+    for yr in reversed(sorted_years[:latest_index + 1]):
         if partner in available[yr] or partner == '000':
             used_year = yr
             break
@@ -136,16 +318,13 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
     if used_year is None:
         used_partner = '000'
         reason_parts.append("partner 000")
-        for yr in sorted_years:
-            if yr > int(target_year):
-                continue
-            used_year = yr
-            break
+        if latest_index >= 0:
+            used_year = sorted_years[latest_index]
     
     if used_year is None:
         return None, "No available year found in WITS"
     
-    if used_year != int(target_year):
+    if used_year != target_year:
         reason_parts.append(f"year {used_year}")
     
     # Step 5: Query WITS tariff with fallbacks on HS granularity
@@ -157,12 +336,25 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
     
     partners_to_try = [partner, '000'] if partner != '000' and not attempted_bilateral else ['000']
     
+    # Probe every partner/HS combination concurrently, then walk the responses in fallback priority order
+    probe_urls = {
+        (p, hs): f"{base_url}/SDMX/V21/datasource/TRN/reporter/{reporter}/partner/{p}/product/{hs}/year/{used_year}/datatype/reported?format=JSON"
+        for p in partners_to_try for hs in hs_levels
+    }
+    unique_urls = list(dict.fromkeys(probe_urls.values()))
+    probe_responses = dict(zip(unique_urls, await asyncio.gather(
+        *(client.get(url, timeout=10) for url in unique_urls),
+        return_exceptions=True
+    )))
+    
     for p in partners_to_try:
         for hs in hs_levels:
-            query_url = f"{base_url}/SDMX/V21/datasource/TRN/reporter/{reporter}/partner/{p}/product/{hs}/year/{used_year}/datatype/reported?format=JSON"
+            query_url = probe_urls[(p, hs)]
             last_query_url = query_url
             try:
-                resp = requests.get(query_url, timeout=10)
+                resp = probe_responses[query_url]
+                if isinstance(resp, BaseException):
+                    raise resp
                 if resp.status_code == 200:
                     data = resp.json()
                     if 'dataSets' in data and data['dataSets']:
@@ -185,7 +377,7 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
                         reason_parts.append(f"zero WITS rate for HS {hs}, partner {p}")
                 if p == partner:
                     attempted_bilateral = True
-            except (requests.RequestException, ValueError, KeyError):
+            except (httpx.HTTPError, ValueError, KeyError):
                 continue
         if rate is not None and rate != 0.0:
             break
@@ -200,75 +392,23 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
     
     reason = "WITS: No fallback needed" if not reason_parts else f"WITS: Fallback to " + " and ".join(reason_parts) + f" at {last_query_url}"
     
-    # Step 6: Cross-reference with WTO API if rate is 0.0 or bilateral partner was requested
+    # Step 6: Cross-reference with WTO API if rate is 0.0, or for a bilateral partner when cross-checking is enabled.
+    # A non-zero WITS rate is trusted by default, skipping the WTO round trips
     wto_rate = None
     wto_reason = ""
-    if (rate == 0.0 or partner != '000') and wto_api_key:
-        # First, we'll fetch the available indicators to find the correct one for tariffs
-        indicators_url = "https://api.wto.org/timeseries/v1/indicators?i=all&t=all&pc=all&tp=all&frq=all&lang=1"
-        
-        headers = {
-            "Cache-Control": "no-cache",
-            "Ocp-Apim-Subscription-Key": wto_api_key
-        }
-        
-        print(f"Fetching available indicators from WTO API...")
-        
-        indicator_code = None
-        tariff_indicator = None
-        
+    if (rate == 0.0 or (wto_crosscheck and partner != '000')) and wto_api_key:
+        # First, find the WTO indicator to use for tariffs (looked up once per process)
         try:
-            # Try to get the list of available indicators
-            indicators_resp = requests.get(indicators_url, headers=headers, timeout=10)
-            
-            if indicators_resp.status_code == 200:
-                indicators_data = indicators_resp.json()
-                print(f"Got indicators response. Searching for tariff indicators...")
-                
-                # Look for indicators related to tariffs by searching their names
-                # The API returns a list of indicators
-                for ind in indicators_data:
-                    if 'code' in ind and 'name' in ind:
-                        if ('tariff' in ind['name'].lower() or 
-                            'duty' in ind['name'].lower() or 
-                            'tax' in ind['name'].lower()):
-                            print(f"Found potential tariff indicator: {ind['code']} - {ind['name']}")
-                            # Capture all potential tariff indicators
-                            # Use the first one we find as fallback
-                            if indicator_code is None:
-                                indicator_code = ind['code']
-                                tariff_indicator = ind
-                            
-                            # Prefer indicators with "MFN" and "average" in the name
-                            # These likely represent Most Favored Nation average tariff rates
-                            if ('mfn' in ind['name'].lower() and 'average' in ind['name'].lower()):
-                                indicator_code = ind['code']
-                                tariff_indicator = ind
-                                break
-                
-                if indicator_code:
-                    # Get indicator name from the tariff indicator
-                    indicator_name = tariff_indicator.get('name', 'Unknown')
-                    print(f"Using indicator code: {indicator_code} ({indicator_name})")
-                else:
-                    print("No suitable tariff indicator found in the response.")
-                    # We can't proceed without an indicator code
-                    return None, "No suitable tariff indicator found in WTO API response"
-            else:
-                print(f"Failed to get indicators: {indicators_resp.status_code}, {indicators_resp.content}")
-                # Can't proceed with WTO API check without valid indicators
-                return None, f"Failed to get indicators from WTO API: HTTP {indicators_resp.status_code}"
-        except Exception as e:
-            print(f"Error fetching indicators: {str(e)}")
-            # Can't proceed with WTO API check without valid indicators
-            return None, f"Error fetching indicators from WTO API: {str(e)}"
+            indicator_code, tariff_indicator = await get_wto_indicator(wto_api_key, client)
+        except WtoIndicatorError as e:
+            return None, str(e)
         
         # Build the URL with proper encoding using urllib.parse
         base_url = "https://api.wto.org/timeseries/v1/data"
         
         # Need to check if the selected indicator supports partner and product dimensions
         # Check indicator metadata for supported dimensions
-        print(f"Checking dimensions for indicator: {indicator_code}")
+        logger.debug("Checking dimensions for indicator: %s", indicator_code)
         
         # Start with basic parameters that should work for any indicator
         params = {
@@ -301,14 +441,14 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
             params["pc"] = hs_code if hs_code else "default"
             params["spc"] = "false"
         
-        print(f"Using dimensions - partner: {has_partner_dim}, product: {has_product_dim}")
+        logger.debug("Using dimensions - partner: %s, product: %s", has_partner_dim, has_product_dim)
         
-        # Manually encode parameters
-        query_string = "&".join(f"{k}={urllib.parse.quote(str(v))}" for k, v in params.items())
+        # Encode parameters
+        query_string = urllib.parse.urlencode(params, safe="/", quote_via=urllib.parse.quote)
         wto_url = f"{base_url}?{query_string}"
         
         # Print the URL for debugging
-        print(f"Making WTO API request to: {wto_url}")
+        logger.debug("Making WTO API request to: %s", wto_url)
         
         try:
             # Use the correct header format as shown in the example
@@ -318,14 +458,14 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
             }
             
             # Try the URL
-            resp = requests.get(wto_url, headers=headers, timeout=10)
-            print(f"WTO API Response status: {resp.status_code}")
+            resp = await client.get(wto_url, headers=headers, timeout=10)
+            logger.debug("WTO API Response status: %s", resp.status_code)
             
             if resp.status_code == 200:
                 try:
                     data = resp.json()
                     # Log the raw response for debugging (limited length to avoid huge logs)
-                    print(f"WTO API Response: {str(data)[:1000]}")
+                    logger.debug("WTO API Response: %.1000s", data)
                     
                     if 'Dataset' in data and data['Dataset']:
                         # Find the tariff rate in the new response format
@@ -346,12 +486,13 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
             else:
                 # Detailed error for non-200 responses
                 try:
-                    error_content = resp.content.decode('utf-8')
-                    print(f"WTO API Error: {error_content}")
+                    # Only a capped prefix of the body is decoded for logging and the reason text
+                    error_content = resp.content[:WTO_ERROR_SNIPPET_BYTES].decode('utf-8', 'replace')
+                    logger.warning("WTO API Error: %s", error_content)
                     
-                    # Check for dimension errors specifically
-                    if "does not have a partner dimension" in error_content or "does not have a product/sector dimension" in error_content:
-                        print("Indicator does not support requested dimensions. Retrying with basic parameters...")
+                    # Check for dimension errors specifically, scanning the raw body once
+                    if _WTO_DIMENSION_ERROR_RE.search(resp.content):
+                        logger.debug("Indicator does not support requested dimensions. Retrying with basic parameters...")
                         
                         # Retry with only the essential parameters
                         simplified_params = {
@@ -363,18 +504,18 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
                         }
                         
                         # Encode simplified parameters
-                        simplified_query = "&".join(f"{k}={urllib.parse.quote(str(v))}" for k, v in simplified_params.items())
+                        simplified_query = urllib.parse.urlencode(simplified_params, safe="/", quote_via=urllib.parse.quote)
                         simplified_url = f"{base_url}?{simplified_query}"
                         
-                        print(f"Retrying with simplified URL: {simplified_url}")
+                        logger.debug("Retrying with simplified URL: %s", simplified_url)
                         
                         # Try the simplified URL
-                        retry_resp = requests.get(simplified_url, headers=headers, timeout=10)
+                        retry_resp = await client.get(simplified_url, headers=headers, timeout=10)
                         
                         if retry_resp.status_code == 200:
                             try:
                                 retry_data = retry_resp.json()
-                                print(f"Simplified WTO API Response: {str(retry_data)[:1000]}")
+                                logger.debug("Simplified WTO API Response: %.1000s", retry_data)
                                 
                                 # Process the simplified response
                                 if 'Dataset' in retry_data and retry_data['Dataset']:
@@ -385,14 +526,14 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
                                             reason += f". Used general tariff rate: {wto_reason}"
                                             break
                             except Exception as retry_e:
-                                print(f"Error processing simplified response: {str(retry_e)}")
+                                logger.warning("Error processing simplified response: %s", retry_e)
                         else:
                             reason += f". WTO API error: {error_content[:200]}"
                     else:
                         reason += f". WTO API error: {error_content[:200]}"
                 except Exception as e:
                     reason += f". WTO API error: Status {resp.status_code}"
-        except (requests.RequestException, ValueError, KeyError) as e:
+        except (httpx.HTTPError, ValueError, KeyError) as e:
             wto_reason = f"WTO API check failed: {str(e)}"
             reason += f". {wto_reason}"
     
@@ -423,7 +564,17 @@ async def request_tariff_from_wits(hs_code: str, partner: str, reporter: str, ta
     
     return final_rate, reason
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled connections of the shared HTTP client on shutdown, if a request created it,
+    # and forget the closed client so a later startup in the same process creates a new one
+    client = get_http_client.cache_peek()
+    if client is not None:
+        await client.aclose()
+    get_http_client.cache_clear()
+
+app = FastAPI(lifespan=lifespan)
 
 # FastAPI dependencies are injected at the endpoint level and passed explicitly to helper functions
 # The repositories are singleton-cached to avoid creating multiple instances for every request
@@ -434,15 +585,19 @@ async def get_tariff(
     req: TariffRequest,
     hs_code_repo: HSCodeRepo = Depends(get_hs_code_repo),
     country_code_repo: CountryCodeRepo = Depends(get_country_code_repo),
-    tariff_config: TariffConfig = Depends(get_tariff_config)
+    tariff_config: TariffConfig = Depends(get_tariff_config),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     # Stage 1: Get HS Code using Google ADK agent
-    hs_code, hs_code_ref = await find_hs_code(req.product, hs_code_repo)
-    reporter_code, reporter_ref = await find_country_code(req.reporter, is_reporter=True, country_code_repo=country_code_repo)
-    partner_code, partner_ref = await find_country_code(req.partner, is_reporter=False, country_code_repo=country_code_repo)
+    # The three lookups are independent, so run them concurrently
+    (hs_code, hs_code_ref), (reporter_code, reporter_ref), (partner_code, partner_ref) = await asyncio.gather(
+        find_hs_code(req.product, hs_code_repo),
+        find_country_code(req.reporter, is_reporter=True, country_code_repo=country_code_repo),
+        find_country_code(req.partner, is_reporter=False, country_code_repo=country_code_repo)
+    )
 
     # Stage 2: Get tariff from WITS with fallback mechanism
-    rate, reason = await request_tariff_from_wits(hs_code, partner_code, reporter_code, req.year, tariff_config.wto_api_key)
+    rate, reason = await request_tariff_from_wits(hs_code, partner_code, reporter_code, req.year, tariff_config.wto_api_key, http_client, wto_crosscheck=tariff_config.wto_crosscheck)
 
     # Stage 3: Format and return response with structured reason dict
     return TariffResponse(
@@ -1,13 +1,130 @@
 import httpx
-import xmltodict
 import asyncio
+import contextlib
+import functools
+import hashlib
+import threading
+import orjson
+from dataclasses import asdict
+import numpy as np
 import pandas as pd
+from io import BytesIO
+from lxml import etree
 from fastapi import HTTPException
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple, AsyncIterator
 from abc import ABC, abstractmethod
-from ..vector_store.vector_store import VectorStore
+from ..vector_store.vector_store import VectorStore, MetadataColumn
+from ..vector_store.config import EmbeddingsConfig
 from ..system_store.system_store import SystemStore, SystemStoreConfig
 from langchain_community.embeddings import HuggingFaceEmbeddings
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Number of texts encoded per forward pass when embedding a whole dataset
+EMBEDDING_BATCH_SIZE = 128
+
+WITS_NAMESPACE = "http://wits.worldbank.org/"
+
+# Repositories refreshed concurrently share the model; GPU inference is serialized, CPU threads interleave.
+# Taken in the worker thread running the model, so it does not depend on any event loop.
+_GPU_ENCODE_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=4)
+def _get_embeddings(model_name: str) -> HuggingFaceEmbeddings:
+    """
+    Return the process-wide embeddings for a model, so its weights are only loaded once
+    no matter how many repositories are created. Inference with the model is reentrant.
+    """
+    config = EmbeddingsConfig()
+    model_kwargs = {}
+    if config.embedding_backend == "onnx":
+        # ONNX Runtime with the quantized export runs the encoder several times faster than eager PyTorch on CPU
+        model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": config.embedding_onnx_file}}
+    # Unit vectors let the vector index rank by inner product, which equals the cosine similarity for them
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs, encode_kwargs={"normalize_embeddings": True})
+
+
+class WitsItemSchema:
+    """
+    Fixed layout of a WITS item: the fields read from its attributes and from its child elements,
+    in column order. Namespaced tags are resolved once per schema, so each item is read with
+    plain lookups into pre-sized columns.
+    """
+    def __init__(self, item_tag: str, attributes: Tuple[str, ...], elements: Tuple[str, ...], categorical: Tuple[str, ...] = ()):
+        self.tag = f"{{{WITS_NAMESPACE}}}{item_tag}"
+        self.columns = attributes + elements
+        # Low-cardinality columns, stored as categoricals instead of one string object per row
+        self.categorical = categorical
+        self._attributes = attributes
+        self._element_tags = tuple(f"{{{WITS_NAMESPACE}}}{name}" for name in elements)
+
+    def extract(self, item: etree._Element) -> List[Optional[str]]:
+        """Return the item's fields in column order, None for missing ones."""
+        get = item.get
+        texts = {child.tag: child.text for child in item}
+        return [get(name) for name in self._attributes] + [texts.get(tag) for tag in self._element_tags]
+
+    def unknown_fields(self, item: etree._Element) -> List[str]:
+        """Return the fields of an item that the schema does not read."""
+        fields = list(item.attrib) + [etree.QName(child).localname for child in item.iterchildren(tag=etree.Element)]
+        return [name for name in fields if name not in self.columns]
+
+
+class _WitsItemColumns:
+    """
+    Collects WITS items into one list per schema column.
+    """
+    def __init__(self, schema: WitsItemSchema):
+        self.schema = schema
+        self.columns: List[List[Optional[str]]] = [[] for _ in schema.columns]
+
+    def add(self, item: etree._Element):
+        if not self.columns[0]:
+            # The feed layout is fixed, so checking the first item is enough to notice a change
+            unknown = self.schema.unknown_fields(item)
+            if unknown:
+                logger.warning("Ignoring fields %s of <%s> that are not in the schema", unknown, item.tag)
+        for column, value in zip(self.columns, self.schema.extract(item)):
+            column.append(value)
+        # Items are independent, free each one once its fields are extracted
+        item.clear()
+
+    def to_dataframe(self) -> pd.DataFrame:
+        df = pd.DataFrame(dict(zip(self.schema.columns, self.columns)), copy=False)
+        for name in self.schema.categorical:
+            df[name] = df[name].astype("category")
+        return df
+
+
+def parse_wits_items(content: bytes, schema: WitsItemSchema) -> pd.DataFrame:
+    """
+    Parse the items of a WITS datasource response into a DataFrame with one column per schema field.
+    """
+    items = _WitsItemColumns(schema)
+    for _, item in etree.iterparse(BytesIO(content), tag=schema.tag):
+        items.add(item)
+    return items.to_dataframe()
+
+
+async def parse_wits_items_stream(chunks: AsyncIterator[bytes], schema: WitsItemSchema) -> pd.DataFrame:
+    """
+    Same as parse_wits_items, but parses the response incrementally while its bytes arrive.
+    """
+    items = _WitsItemColumns(schema)
+    parser = etree.XMLPullParser(events=("end",), tag=schema.tag)
+    async for chunk in chunks:
+        parser.feed(chunk)
+        for _, item in parser.read_events():
+            items.add(item)
+    parser.close()
+    for _, item in parser.read_events():
+        items.add(item)
+    return items.to_dataframe()
+
 
 class BaseVectorRepo(ABC):
     """
@@ -18,11 +135,24 @@ class BaseVectorRepo(ABC):
         self.config = config
         self.system_config = system_config if system_config is not None else SystemStoreConfig()
         self.table_name = self.config.postgres_table
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = _get_embeddings(EMBEDDING_MODEL_NAME)
         self.metadata_columns = None
         self.vector_store = None
         self.system_store = None
+        self._http: Optional[httpx.AsyncClient] = None
         self.metadata_key = self._get_metadata_key()
+        # Serializes lazy initialization when several lookups run concurrently
+        self._init_lock = asyncio.Lock()
+        # Called once the data is replaced or dropped, e.g. to clear lookups cached from the previous data
+        self._change_listeners: List[Callable[[], Any]] = []
+
+    def add_change_listener(self, listener: Callable[[], Any]):
+        """Register a callback run after a refresh replaces the data and after a drop."""
+        self._change_listeners.append(listener)
+
+    def _notify_change(self):
+        for listener in self._change_listeners:
+            listener()
 
     @abstractmethod
     def _get_metadata_key(self) -> str:
@@ -39,6 +169,14 @@ class BaseVectorRepo(ABC):
         """Process the API response and return a DataFrame."""
         pass
 
+    async def _process_api_stream(self, chunks: AsyncIterator[bytes]) -> pd.DataFrame:
+        """
+        Process the API response body as it is received and return a DataFrame.
+        Buffers the whole body for _process_api_response unless overridden with a streaming parser.
+        """
+        content = b"".join([chunk async for chunk in chunks])
+        return self._process_api_response(content.decode())
+
     @abstractmethod
     def _get_content_column(self) -> str:
         """Return the name of the column to use for content embedding."""
@@ -49,23 +187,78 @@ class BaseVectorRepo(ABC):
         Ensure the vector store and metadata columns are initialized.
         This should be called at the beginning of each async operation.
         """
+        # The vector store is created last, so once it exists the metadata columns are loaded
+        # and every call can skip the lock until drop resets them
+        if self.vector_store is not None:
+            return
+
+        async with self._init_lock:
+            await self._connect_system_store()
+
+            if self.metadata_columns is None:
+                self.metadata_columns = await self._load_metadata_columns()
+                if self.metadata_columns is None:
+                    raise Exception(f"Failed to load metadata columns from system store. Please fetch data first.")
+            
+            if self.vector_store is None:
+                self.vector_store = self._new_vector_store()
+                await self.vector_store.connect()
+
+    def _new_vector_store(self) -> VectorStore:
+        """Return a vector store over the repository's table, not connected yet."""
+        return VectorStore(
+            embeddings=self.embeddings,
+            table_name=self.table_name,
+            content_column=self._get_content_column(),
+            metadata_columns=self.metadata_columns
+        )
+
+    async def _connect_system_store(self):
+        """Connect the system store if it is not connected yet."""
         if self.system_store is None:
             self.system_store = SystemStore(self.system_config)
             await self.system_store.connect()
 
-        if self.metadata_columns is None:
-            self.metadata_columns = await self._load_metadata_columns()
-            if self.metadata_columns is None:
-                raise Exception(f"Failed to load metadata columns from system store. Please fetch data first.")
-            
-        if self.vector_store is None:
-            self.vector_store = VectorStore(
-                embeddings=self.embeddings,
-                table_name=self.table_name,
-                content_column=self._get_content_column(),
-                metadata_columns=self.metadata_columns
-            )
-            await self.vector_store.connect()
+    async def _ensure_system_store(self):
+        """
+        Ensure only the system store is initialized, for operations that must not create the vector store yet.
+        """
+        async with self._init_lock:
+            await self._connect_system_store()
+
+    def _get_embedding_settings(self, vector_store: VectorStore) -> Dict[str, Any]:
+        """
+        Return the settings that determine the vector stored for a text: how it is computed and the
+        column type it is stored as. They are stored with the loaded data, so its embeddings are only
+        reused by a refresh that would store the same ones, e.g. not halfvec-rounded ones in a vector column.
+        """
+        model_kwargs = self.embeddings.model_kwargs
+        return {
+            "model": EMBEDDING_MODEL_NAME,
+            "backend": model_kwargs.get("backend", "torch"),
+            "onnx_file": model_kwargs.get("model_kwargs", {}).get("file_name"),
+            "normalize": self.embeddings.encode_kwargs.get("normalize_embeddings", False),
+            "vector_type": vector_store.config.vector_type,
+            "vector_size": vector_store.config.vector_size
+        }
+
+    def _get_settings_fingerprint(self, vector_store: VectorStore) -> str:
+        """
+        Return a digest of the settings the loaded table is built with besides the data itself:
+        the item schema, the vector table layout and the embedding settings.
+        """
+        schema = getattr(self, "SCHEMA", None)
+        settings = {
+            "schema": [schema.tag, list(schema.columns), list(schema.categorical)] if schema is not None else None,
+            "content_column": self._get_content_column(),
+            "vector_store": vector_store.layout_settings(),
+            "embedding": self._get_embedding_settings(vector_store)
+        }
+        return hashlib.sha256(orjson.dumps(settings, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def _get_response_cache_key(self) -> str:
+        """Return the key used to store the validators of the last loaded API response in the system store."""
+        return f"{self.metadata_key}_response"
 
     async def drop(self):
         """
@@ -79,19 +272,21 @@ class BaseVectorRepo(ABC):
         await self.vector_store.close()
         self.vector_store = None
         
-        # Remove metadata from system store and clean up
+        # Remove metadata from system store and clean up, the next fetch must load the data again
         await self.system_store.delete_item(self.metadata_key)
+        await self.system_store.delete_item(self._get_response_cache_key())
         self.metadata_columns = None
+        self._notify_change()
 
-    async def find_items(self, query: str, top_k: int = 1, metadata: dict = None) -> List[Dict[str, Any]]:
+    async def find_items(self, query: str, top_k: int = 1, metadata: dict = None, ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Connect to the vectorstore and query the items.
+        Connect to the vectorstore and query the items, with an optional per-search HNSW ef_search.
         """
         await self._ensure_initialized()
-        results = await self.vector_store.find_content(query, top_k=top_k, filter=metadata)
+        results = await self.vector_store.find_content(query, top_k=top_k, filter=metadata, ef_search=ef_search)
         return results
 
-    async def _load_metadata_columns(self) -> List[Dict[str, Any]]:
+    async def _load_metadata_columns(self) -> List[MetadataColumn]:
         """
         Load metadata columns from system store and cache them in the instance.
         If no metadata columns are found, returns an empty list.
@@ -101,15 +296,14 @@ class BaseVectorRepo(ABC):
             raise Exception("System store is not initialized.")
         
         # Get metadata columns from the store
-        self.metadata_columns = await self.system_store.get_item(self.metadata_key)
+        stored_columns = await self.system_store.get_item(self.metadata_key)
         
         # If no metadata columns are found, use an empty list to prevent errors
-        if self.metadata_columns is None:
-            self.metadata_columns = []
+        self.metadata_columns = [MetadataColumn(**col) for col in stored_columns] if stored_columns else []
             
         return self.metadata_columns
 
-    async def _save_metadata_columns(self, metadata_columns: List[Dict[str, Any]]):
+    async def _save_metadata_columns(self, metadata_columns: List[MetadataColumn]):
         """
         Save metadata columns to the system store and update the instance attribute.
         """
@@ -117,7 +311,7 @@ class BaseVectorRepo(ABC):
             raise Exception("System store is not initialized.")
         
         self.metadata_columns = metadata_columns
-        await self.system_store.upsert_item(self.metadata_key, metadata_columns)
+        await self.system_store.upsert_item(self.metadata_key, [asdict(col) for col in metadata_columns])
 
     async def close(self):
         """
@@ -131,26 +325,120 @@ class BaseVectorRepo(ABC):
             await self.system_store.close()
             self.system_store = None
 
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Return the HTTP client kept for the repository's lifetime, creating it on first use,
+        so repeated fetches reuse pooled connections instead of reconnecting.
+        """
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=httpx.Timeout(60.0), limits=httpx.Limits(max_keepalive_connections=8))
+        return self._http
+
+    async def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode all texts in large batches directly with the sentence-transformer model.
+        Returns an (N, vector size) float32 matrix in the same order as `texts`.
+        """
+        # encode() sorts the texts by length before batching and restores the input order itself,
+        # so each batch pads to similar lengths; run it off the event loop as it is CPU bound
+        encode_kwargs = {**self.embeddings.encode_kwargs, "batch_size": EMBEDDING_BATCH_SIZE, "convert_to_numpy": True}
+        try:
+            on_gpu = self.embeddings.client.device.type == "cuda"
+        except StopIteration:
+            # An ONNX model holds no torch tensors and runs on the CPU execution provider
+            on_gpu = False
+
+        def encode() -> np.ndarray:
+            with _GPU_ENCODE_LOCK if on_gpu else contextlib.nullcontext():
+                return self.embeddings.client.encode(texts, **encode_kwargs)
+
+        matrix = await asyncio.to_thread(encode)
+        return matrix.astype(np.float32, copy=False)
+
+    async def _embed_contents(self, texts: List[str], reuse_stored: bool) -> np.ndarray:
+        """
+        Embed the contents of a refresh, in the same order as `texts`. With `reuse_stored`,
+        only contents the vector table does not hold yet are encoded.
+        """
+        known = await self.vector_store.find_embeddings(texts) if reuse_stored else {}
+        missing = [text for text in dict.fromkeys(texts) if text not in known]
+        if missing:
+            known.update(zip(missing, await self._embed_texts(missing)))
+        logger.info("Encoded %d of %d contents, reused the stored embeddings of the others", len(missing), len(texts))
+        return np.array([known[text] for text in texts], dtype=np.float32)
+
     async def fetch_data(self):
         """
         Call API to get all data and store it in vector store.
         """
         url = self._get_api_url()
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url)
+        client = self._get_http_client()
+        try:
+            # Validators of the response loaded last time, to skip the refresh when the data is unchanged
+            await self._ensure_system_store()
+            cached = await self.system_store.get_item(self._get_response_cache_key()) or {}
+            # The loaded data is only kept while its table exists and was built with the current settings,
+            # otherwise the refresh loads the data again even if it is unchanged, migrating the table
+            vector_store = self.vector_store or self._new_vector_store()
+            fingerprint = self._get_settings_fingerprint(vector_store)
+            keep_loaded = (
+                cached.get("settings") == fingerprint
+                and await vector_store.table_exists()
+                and not await vector_store.layout_outdated()
+            )
+            headers = {}
+            if keep_loaded and cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if keep_loaded and cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+            body_hash = hashlib.sha256()
+
+            async def hashed_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+                async for chunk in chunks:
+                    body_hash.update(chunk)
+                    yield chunk
+
+            # Parse the body while it downloads instead of buffering it as text first
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304:
+                    return True
                 response.raise_for_status()
+                df = await self._process_api_stream(hashed_chunks(response.aiter_bytes()))
+                response_cache = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "sha256": body_hash.hexdigest(),
+                    "settings": fingerprint,
+                    "embedding": self._get_embedding_settings(vector_store)
+                }
 
-                df = self._process_api_response(response.text)
-                self.metadata_columns = [{"name": col, "data_type": "text", "nullable": True} for col in df.columns]   
-                
-                # Initialize system store only, not vector store
-                await self._ensure_initialized()
-                await self.vector_store.truncate_store()
-                await self.vector_store.add_dataframe(df)
-                
-                # Save metadata using the initialized system store
-                await self._save_metadata_columns(self.metadata_columns)
+            # Servers that ignore the conditional headers may still send the same body
+            if keep_loaded and response_cache["sha256"] == cached.get("sha256"):
+                await self.system_store.upsert_item(self._get_response_cache_key(), response_cache)
                 return True
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
+
+            self.metadata_columns = [MetadataColumn(col) for col in df.columns]
+
+            await self._ensure_initialized()
+
+            # Embed every row up front so the rows can be streamed in with a single COPY.
+            # Rows whose content is unchanged keep the embedding already stored for them,
+            # as long as it was computed by the same model, backend and normalization.
+            reuse_embeddings = cached.get("embedding") == response_cache["embedding"]
+            embeddings_matrix = await self._embed_contents(df[self._get_content_column()].tolist(), reuse_embeddings)
+            
+            # Swap the new rows in at once; searches keep using the previous rows until then
+            await self.vector_store.replace_dataframe(df, embeddings_matrix)
+            
+            # Save metadata using the initialized system store
+            await self._save_metadata_columns(self.metadata_columns)
+            await self.system_store.upsert_item(self._get_response_cache_key(), response_cache)
+            self._notify_change()
+            return True
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
@@ -6,6 +6,7 @@ from ..vector_store.config import VectorStoreConfig
 
 class TariffConfig(BaseSettings):
     wto_api_key: str = Field(..., description="WTO API key")
+    wto_crosscheck: bool = Field(False, description="Cross-reference non-zero bilateral WITS rates with the WTO API")
 
     class Config:
         case_sensitive = False
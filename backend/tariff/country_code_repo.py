@@ -1,19 +1,27 @@
-import httpx
-import xmltodict
 import asyncio
 import pandas as pd
-from fastapi import HTTPException
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from .config import CountryCodeRepoConfig
-from ..vector_store.vector_store import VectorStore
-from ..system_store.system_store import SystemStore, SystemStoreConfig
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from .base_repo import BaseVectorRepo
+from ..system_store.system_store import SystemStoreConfig
+from .base_repo import BaseVectorRepo, WitsItemSchema, parse_wits_items, parse_wits_items_stream
 
 class CountryCodeRepo(BaseVectorRepo):
+    # Fields of a <wits:country> item
+    SCHEMA = WitsItemSchema(
+        "country",
+        attributes=("countrycode", "isreporter", "ispartner", "isgroup", "grouptype"),
+        elements=("iso3Code", "name", "notes"),
+        categorical=("isreporter", "ispartner", "isgroup", "grouptype")
+    )
+
     def __init__(self, config: CountryCodeRepoConfig = None, system_config: SystemStoreConfig = None):
         config = config if config is not None else CountryCodeRepoConfig()
         super().__init__(config, system_config)
+        # (casefolded name, isreporter) -> item, built lazily from the loaded rows
+        self._name_index: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None
+        # Bumped whenever the data changes, so an index built from the previous rows is not kept
+        self._name_index_version = 0
+        self.add_change_listener(self._clear_name_index)
 
     def _get_metadata_key(self) -> str:
         """Return the key used to store metadata in the system store."""
@@ -29,13 +37,11 @@ class CountryCodeRepo(BaseVectorRepo):
     
     def _process_api_response(self, response_text: str) -> pd.DataFrame:
         """Process the API response and return a DataFrame."""
-        doc = xmltodict.parse(response_text)
-        items = doc.get('wits:datasource', {}).get('wits:countries', []).get('wits:country', [])
-        
-        df = pd.json_normalize(items)
-        df.columns = [col.replace('@', '').replace('wits:', '') for col in df.columns]
-        
-        return df
+        return parse_wits_items(response_text.encode(), self.SCHEMA)
+
+    async def _process_api_stream(self, chunks: AsyncIterator[bytes]) -> pd.DataFrame:
+        """Parse the API response incrementally as it is received and return a DataFrame."""
+        return await parse_wits_items_stream(chunks, self.SCHEMA)
     
     async def find_country_codes(self, name: str, top_k: int = 1, metadata: dict = None) -> List[Dict[str, Any]]:
         """
@@ -43,41 +49,39 @@ class CountryCodeRepo(BaseVectorRepo):
         """
         return await self.find_items(name, top_k=top_k, metadata=metadata)
     
-    async def fetch_country_codes(self):
+    async def find_exact_country_code(self, name: str, is_reporter: bool) -> Optional[Dict[str, Any]]:
         """
-        Call WITS REST API to get all country code.
+        Look up a country by its exact, case-insensitive name among the loaded countries.
+        Returns the item in the same shape as find_country_codes, or None if there is no exact match.
         """
-        return await self.fetch_data()
+        if self._name_index is None:
+            await self._load_name_index()
+        return self._name_index.get((name.strip().casefold(), "1" if is_reporter else "0"))
 
-    async def fetch_country_codes(self):
+    async def _load_name_index(self):
         """
-        Call WITS REST API to get all country code.
+        Build the exact-name index from the rows of the country table, read without blocking the event loop.
         """
-        url = 'https://wits.worldbank.org/API/V1/wits/datasource/trn/country/ALL'
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url)
-                response.raise_for_status()
-                xml_response = response.text
+        while True:
+            version = self._name_index_version
+            await self._ensure_initialized()
+            index = {}
+            for row in await self.vector_store.find_rows():
+                index.setdefault((row["content"].strip().casefold(), row["metadata"].get("isreporter")), row)
+            # Rows read while a refresh replaced them are read again from the new table
+            if version == self._name_index_version:
+                self._name_index = index
+                return
 
-                ns = {'wits': 'http://wits.worldbank.org/'}
-                doc = xmltodict.parse(response.text)
-                items = doc.get('wits:datasource', {}).get('wits:countries', []).get('wits:country', [])
+    def _clear_name_index(self):
+        self._name_index_version += 1
+        self._name_index = None
 
-                df = pd.json_normalize(items)
-                df.columns = [col.replace('@', '').replace('wits:', '') for col in df.columns]
-
-                self.metadata_columns = [{"name": col, "data_type": "text", "nullable": True} for col in df.columns]   
-                # Initialize system store only, not vector store
-                await self._ensure_initialized()
-                await self.vector_store.truncate_store()
-                await self.vector_store.add_dataframe(df)
-                
-                # Save metadata using the initialized system store
-                await self._save_metadata_columns(self.metadata_columns)
-                return True
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error fetching country code: {str(e)}")
+    async def fetch_country_codes(self):
+        """
+        Call WITS REST API to get all country code.
+        """
+        return await self.fetch_data()
 
 # Add a main method
 if __name__ == "__main__":
@@ -1,14 +1,19 @@
-import httpx
-import xmltodict
 import asyncio
 import pandas as pd
-from fastapi import HTTPException
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator
 from .config import HSCodeRepoConfig
 from ..system_store.system_store import SystemStoreConfig
-from .base_repo import BaseVectorRepo
+from .base_repo import BaseVectorRepo, WitsItemSchema, parse_wits_items, parse_wits_items_stream
 
 class HSCodeRepo(BaseVectorRepo):
+    # Fields of a <wits:product> item
+    SCHEMA = WitsItemSchema(
+        "product",
+        attributes=("productcode", "isgroup", "nomenclaturecode", "grouptype"),
+        elements=("productdescription",),
+        categorical=("isgroup", "nomenclaturecode", "grouptype")
+    )
+
     def __init__(self, config: HSCodeRepoConfig = None, system_config: SystemStoreConfig = None):
         config = config if config is not None else HSCodeRepoConfig()
         super().__init__(config, system_config)
@@ -27,13 +32,11 @@ class HSCodeRepo(BaseVectorRepo):
     
     def _process_api_response(self, response_text: str) -> pd.DataFrame:
         """Process the API response and return a DataFrame."""
-        doc = xmltodict.parse(response_text)
-        products = doc.get('wits:datasource', {}).get('wits:products', {}).get('wits:product', [])
-        
-        df = pd.json_normalize(products)
-        df.columns = [col.replace('@', '').replace('wits:', '') for col in df.columns]
-        
-        return df
+        return parse_wits_items(response_text.encode(), self.SCHEMA)
+
+    async def _process_api_stream(self, chunks: AsyncIterator[bytes]) -> pd.DataFrame:
+        """Parse the API response incrementally as it is received and return a DataFrame."""
+        return await parse_wits_items_stream(chunks, self.SCHEMA)
     
     async def find_hs_codes(self, name: str, top_k: int = 1, metadata: dict = None) -> List[Dict[str, Any]]:
         """
@@ -47,37 +50,6 @@ class HSCodeRepo(BaseVectorRepo):
         """
         return await self.fetch_data()
 
-
-    async def fetch_hs_codes(self):
-        """
-        Call WITS REST API to get all HS codes.
-        """
-
-        
-        url = "https://wits.worldbank.org/API/V1/wits/datasource/trn/product/all"
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url)
-                response.raise_for_status()
-
-                doc = xmltodict.parse(response.text)
-                products = doc.get('wits:datasource', {}).get('wits:products', {}).get('wits:product', [])
-
-                df = pd.json_normalize(products)
-                df.columns = [col.replace('@', '').replace('wits:', '') for col in df.columns]
-                self.metadata_columns = [{"name": col, "data_type": "text", "nullable": True} for col in df.columns]   
-                
-                # Initialize system store only, not vector store
-                await self._ensure_initialized()
-                await self.vector_store.truncate_store()
-                await self.vector_store.add_dataframe(df)
-                
-                # Save metadata using the initialized system store
-                await self._save_metadata_columns(self.metadata_columns)
-                return True
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error fetching HS codes: {str(e)}")
-
 # Add a main method
 if __name__ == "__main__":
     async def main():
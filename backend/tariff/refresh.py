@@ -0,0 +1,27 @@
+import asyncio
+from .country_code_repo import CountryCodeRepo
+from .hs_code_repo import HSCodeRepo
+
+
+async def refresh_all():
+    """
+    Refresh the country codes and the HS codes from WITS concurrently, so the download of
+    one dataset overlaps with the embedding of the other.
+    """
+    country_code_repo = CountryCodeRepo()
+    hs_code_repo = HSCodeRepo()
+    try:
+        await asyncio.gather(
+            country_code_repo.fetch_country_codes(),
+            hs_code_repo.fetch_hs_codes()
+        )
+    finally:
+        await asyncio.gather(country_code_repo.close(), hs_code_repo.close())
+
+# Add a main method
+if __name__ == "__main__":
+    async def main():
+        await refresh_all()
+        print("Country codes and HS codes fetched successfully.")
+
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""
+Shared checks for the responses of get_tariff.
+
+This is not a test module, so pytest does not rewrite its assertions; they carry their own messages.
+"""
+from typing import Any, Dict
+
+from backend.tariff.models import TariffResponse
+
+
+def check_tariff_response(result: Any, expected: Dict[str, Any]):
+    """
+    Check a get_tariff result against the expected values.
+
+    `expected` holds the `hs_code` and `tariff`, the expected `content` (or `content_prefix`)
+    and `metadata` of each reference in the reason, and the fragments the `tariff_fallback`
+    message must contain. Metadata fields not listed are not checked.
+    """
+    assert isinstance(result, TariffResponse), f"Expected a TariffResponse, got {type(result).__name__}"
+    assert result.hs_code == expected["hs_code"], f"hs_code {result.hs_code!r} != {expected['hs_code']!r}"
+    assert result.tariff == expected["tariff"], f"tariff {result.tariff!r} != {expected['tariff']!r}"
+    assert isinstance(result.reason, dict), f"Expected the reason to be a dict, got {type(result.reason).__name__}"
+
+    for ref_name in ("hs_code_ref", "reporter_code_ref", "partner_code_ref"):
+        expected_ref = expected[ref_name]
+        ref = result.reason.get(ref_name)
+        assert ref is not None, f"{ref_name} missing from the reason"
+
+        content = ref["content"]
+        if "content_prefix" in expected_ref:
+            assert content.startswith(expected_ref["content_prefix"]), \
+                f"{ref_name} content {content!r} does not start with {expected_ref['content_prefix']!r}"
+        else:
+            assert content == expected_ref["content"], f"{ref_name} content {content!r} != {expected_ref['content']!r}"
+
+        for field, value in expected_ref["metadata"].items():
+            actual = ref["metadata"].get(field)
+            assert actual == value, f"{ref_name} metadata {field} {actual!r} != {value!r}"
+
+    fallback = result.reason.get("tariff_fallback")
+    assert isinstance(fallback, str), f"Expected tariff_fallback to be a string, got {fallback!r}"
+    for fragment in expected["tariff_fallback"]:
+        assert fragment in fallback, f"{fragment!r} not in tariff_fallback {fallback!r}"
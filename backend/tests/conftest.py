@@ -1,8 +1,12 @@
 import os
 import pytest
+import pytest_asyncio
 import sys
 from dotenv import load_dotenv
 
+# Shared assertion helpers get pytest's assertion rewriting like the test modules, so their failures show the compared values
+pytest.register_assert_rewrite("backend.tests._tariff_asserts")
+
 # Auto-load .env file at the beginning of test session
 def pytest_configure(config):
     """
@@ -19,3 +23,43 @@ def pytest_configure(config):
         print(f"ERROR: .env file not found at {env_path}", file=sys.stderr)
         print(f"Tests require a properly configured .env file in the backend folder. Please create one before running tests.", file=sys.stderr)
         sys.exit(1)  # Exit with error code 1
+
+
+@pytest.fixture(scope="session")
+def embeddings():
+    """
+    Embeddings model shared by the whole test session, the same instance the repositories use,
+    so the model weights are only loaded once.
+    """
+    from backend.tariff.base_repo import _get_embeddings, EMBEDDING_MODEL_NAME
+    return _get_embeddings(EMBEDDING_MODEL_NAME)
+
+
+# The tariff API dependencies are singletons; as session fixtures they are looked up once
+# and shared by every test, which then needs to run on the session event loop
+@pytest.fixture(scope="session")
+def hs_code_repo():
+    from backend.tariff.api import get_hs_code_repo
+    return get_hs_code_repo()
+
+
+@pytest.fixture(scope="session")
+def country_code_repo():
+    from backend.tariff.api import get_country_code_repo
+    return get_country_code_repo()
+
+
+@pytest.fixture(scope="session")
+def tariff_config():
+    from backend.tariff.api import get_tariff_config
+    return get_tariff_config()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def http_client():
+    from backend.tariff.api import get_http_client
+    client = get_http_client()
+    yield client
+    # Closed on the session loop its connections were opened on, and dropped from the singleton cache
+    await client.aclose()
+    get_http_client.cache_clear()
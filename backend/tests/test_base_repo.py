@@ -4,7 +4,8 @@ import os
 from unittest.mock import AsyncMock, MagicMock, patch
 import httpx
 import asyncio
-from backend.tariff.base_repo import BaseVectorRepo
+from lxml import etree
+from backend.tariff.base_repo import BaseVectorRepo, WitsItemSchema, parse_wits_items, parse_wits_items_stream
 from backend.system_store.system_store import SystemStore, SystemStoreConfig
 from backend.vector_store.vector_store import VectorStore, VectorStoreConfig
 from backend.vector_store.config import VectorStoreConfig
@@ -22,35 +23,10 @@ class TestRepo(BaseVectorRepo):
         return "content"
     
     def _process_api_response(self, response_text: str) -> pd.DataFrame:
-        # Process the XML response
-        import xmltodict
-        
-        # Parse XML string to dictionary
-        data_dict = xmltodict.parse(response_text)
-        
-        # Extract items from the XML structure
-        items = data_dict.get('root', {}).get('items', {}).get('item', [])
-        if not isinstance(items, list):
-            items = [items]  # Ensure items is a list
-        
-        # Extract content and metadata from items
-        contents = []
-        categories = []
-        ids = []
-        
-        for item in items:
-            contents.append(item.get('@description', ''))
-            categories.append(item.get('@category', ''))
-            ids.append(item.get('@id', ''))
-        
-        # Create DataFrame
-        data = {
-            "content": contents,
-            "category": categories,
-            "id": ids
-        }
-        
-        return pd.DataFrame(data)
+        # Read the content and metadata from the attributes of each <item>
+        items = etree.fromstring(response_text.encode()).iter("item")
+        rows = [(item.get("description", ""), item.get("category", ""), item.get("id", "")) for item in items]
+        return pd.DataFrame(rows, columns=["content", "category", "id"])
 
 class TestConfig:
     postgres_table = "test_integration_table"
@@ -86,12 +62,25 @@ def mock_http_response():
     </root>
     """
     
+    async def aiter_bytes():
+        yield xml_data.encode()
+
     mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.headers = {"ETag": '"test-etag"'}
     mock_response.text = xml_data
+    mock_response.aiter_bytes = aiter_bytes
     mock_response.raise_for_status = MagicMock()
     
     return mock_response
 
+def make_mock_client(response):
+    """Mock HTTP client whose stream() context yields the given response"""
+    mock_client = AsyncMock()
+    mock_client.stream = MagicMock()
+    mock_client.stream.return_value.__aenter__.return_value = response
+    return mock_client
+
 @pytest.mark.asyncio
 async def test_initialization(test_repo):
     """Test if the repository can be properly initialized with real dependencies"""
@@ -105,12 +94,83 @@ async def test_initialization(test_repo):
     # Clean up
     await test_repo.close()
 
+def test_parse_wits_items():
+    """Test that WITS items are parsed into one column per schema field"""
+    xml_data = b"""<?xml version="1.0" encoding="utf-8"?>
+    <wits:datasource xmlns:wits="http://wits.worldbank.org/">
+        <wits:countries>
+            <wits:country countrycode="004" isreporter="1">
+                <wits:iso3Code>AFG</wits:iso3Code>
+                <wits:name>Afghanistan</wits:name>
+                <wits:notes></wits:notes>
+            </wits:country>
+            <wits:country countrycode="840" isreporter="1" isgroup="No">
+                <wits:iso3Code>USA</wits:iso3Code>
+                <wits:name>United States</wits:name>
+                <wits:notes></wits:notes>
+            </wits:country>
+        </wits:countries>
+    </wits:datasource>
+    """
+
+    schema = WitsItemSchema(
+        "country",
+        attributes=("countrycode", "isreporter", "isgroup"),
+        elements=("iso3Code", "name"),
+        categorical=("isreporter",)
+    )
+
+    df = parse_wits_items(xml_data, schema)
+
+    assert list(df.columns) == ["countrycode", "isreporter", "isgroup", "iso3Code", "name"]
+    assert df["name"].tolist() == ["Afghanistan", "United States"]
+    assert df["countrycode"].tolist() == ["004", "840"]
+    # Fields missing from an item are empty
+    assert pd.isna(df["isgroup"][0])
+    assert df["isgroup"][1] == "No"
+    # Low-cardinality columns are categoricals
+    assert isinstance(df["isreporter"].dtype, pd.CategoricalDtype)
+    assert df["isreporter"].tolist() == ["1", "1"]
+
+@pytest.mark.asyncio
+async def test_parse_wits_items_stream():
+    """Test that WITS items split across received chunks are parsed like a complete response"""
+    xml_data = b"""<?xml version="1.0" encoding="utf-8"?>
+    <wits:datasource xmlns:wits="http://wits.worldbank.org/">
+        <wits:products>
+            <wits:product productcode="851830" isgroup="No">
+                <wits:productdescription>Headphones and earphones</wits:productdescription>
+            </wits:product>
+            <wits:product productcode="010121" isgroup="No">
+                <wits:productdescription>Live horses</wits:productdescription>
+            </wits:product>
+        </wits:products>
+    </wits:datasource>
+    """
+
+    async def chunks():
+        for i in range(0, len(xml_data), 64):
+            yield xml_data[i:i + 64]
+
+    schema = WitsItemSchema("product", attributes=("productcode", "isgroup"), elements=("productdescription",))
+    df = await parse_wits_items_stream(chunks(), schema)
+
+    assert df.equals(parse_wits_items(xml_data, schema))
+    assert df["productcode"].tolist() == ["851830", "010121"]
+    assert df["productdescription"].tolist() == ["Headphones and earphones", "Live horses"]
+
+def test_embeddings_shared_across_repos():
+    """Test that repositories share a single embeddings instance instead of loading the model each time"""
+    first_repo = TestRepo(TestConfig())
+    second_repo = TestRepo(TestConfig())
+
+    assert first_repo.embeddings is second_repo.embeddings
+
 @pytest.mark.asyncio
 async def test_fetch_data(test_repo, mock_http_response):
     """Test fetching data with mocked HTTP response but real storage backends"""
     # Mock the HTTP client
-    mock_client = AsyncMock()
-    mock_client.__aenter__.return_value.get.return_value = mock_http_response
+    mock_client = make_mock_client(mock_http_response)
     
     # Apply the mock only for the HTTP client
     with patch("backend.tariff.base_repo.httpx.AsyncClient", return_value=mock_client):
@@ -132,12 +192,46 @@ async def test_fetch_data(test_repo, mock_http_response):
     assert "category" in column_names
     assert "id" in column_names
 
+    # The embedding settings are stored with the response, so a refresh under other settings re-encodes
+    response_cache = await test_repo.system_store.get_item(test_repo._get_response_cache_key())
+    assert response_cache["embedding"] == test_repo._get_embedding_settings(test_repo.vector_store)
+
+@pytest.mark.asyncio
+async def test_fetch_data_unchanged(test_repo, mock_http_response):
+    """Test that a refresh sends the stored validators and does not reload unchanged data"""
+    mock_client = make_mock_client(mock_http_response)
+    with patch("backend.tariff.base_repo.httpx.AsyncClient", return_value=mock_client):
+        await test_repo.fetch_data()
+
+    # The server answers the conditional request with 304 Not Modified
+    mock_client.stream.return_value.__aenter__.return_value = MagicMock(status_code=304)
+    with patch.object(test_repo, "_embed_texts") as mock_embed:
+        assert await test_repo.fetch_data() is True
+        mock_embed.assert_not_called()
+    assert mock_client.stream.call_args.kwargs["headers"]["If-None-Match"] == '"test-etag"'
+
+    # The same body sent again is not reloaded either
+    mock_client.stream.return_value.__aenter__.return_value = mock_http_response
+    with patch.object(test_repo, "_embed_texts") as mock_embed:
+        assert await test_repo.fetch_data() is True
+        mock_embed.assert_not_called()
+
+    # The data loaded by the first fetch is still there
+    results = await test_repo.find_items("laptop", top_k=1)
+    assert len(results) > 0
+
+    # Once the table settings change, the same data is loaded again without conditional headers
+    with patch.object(test_repo, "_get_settings_fingerprint", return_value="other settings"), \
+            patch.object(test_repo.vector_store, "replace_dataframe") as mock_replace:
+        assert await test_repo.fetch_data() is True
+        mock_replace.assert_called_once()
+    assert "If-None-Match" not in mock_client.stream.call_args.kwargs["headers"]
+
 @pytest.mark.asyncio
 async def test_find_items(test_repo, mock_http_response):
     """Test searching for items after data has been fetched"""
     # Mock HTTP client for fetch_data
-    mock_client = AsyncMock()
-    mock_client.__aenter__.return_value.get.return_value = mock_http_response
+    mock_client = make_mock_client(mock_http_response)
     
     # First, fetch data to populate the vector store
     with patch("backend.tariff.base_repo.httpx.AsyncClient", return_value=mock_client):
@@ -166,15 +260,20 @@ async def test_find_items(test_repo, mock_http_response):
 @pytest.mark.asyncio
 async def test_drop(test_repo, mock_http_response):
     """Test dropping the repository data"""
+    # Change listeners run after the data is loaded and after it is dropped
+    listener = MagicMock()
+    test_repo.add_change_listener(listener)
+
     # First load some data
-    mock_client = AsyncMock()
-    mock_client.__aenter__.return_value.get.return_value = mock_http_response
+    mock_client = make_mock_client(mock_http_response)
     
     with patch("backend.tariff.base_repo.httpx.AsyncClient", return_value=mock_client):
         await test_repo.fetch_data()
+    assert listener.call_count == 1
     
     # Now drop everything
     await test_repo.drop()
+    assert listener.call_count == 2
     
     # Check that metadata is gone from system store
     await test_repo._ensure_initialized()  # Reinitialize
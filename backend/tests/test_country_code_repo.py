@@ -3,13 +3,12 @@ from backend.tariff.config import CountryCodeRepoConfig
 from backend.tariff.country_code_repo import CountryCodeRepo
 from backend.vector_store.vector_store import VectorStore
 from backend.system_store.system_store import SystemStore, SystemStoreConfig
-from langchain_community.embeddings import HuggingFaceEmbeddings
 
 
 @pytest.mark.asyncio
 async def test_store_and_found_country_code() -> str:
     config = CountryCodeRepoConfig(postgres_table="test_country_code_table")
-    system_config = SystemStoreConfig(postgres_table="test_system_table")
+    system_config = SystemStoreConfig(postgres_table="test_country_code_system_table")
     repo = CountryCodeRepo(config, system_config)
     result = await repo.fetch_country_codes()
     results = await repo.find_country_codes("United States")
@@ -34,10 +33,10 @@ async def test_store_and_found_country_code() -> str:
 
 
 @pytest.mark.asyncio
-async def test_drop_country_code_repo():
+async def test_drop_country_code_repo(embeddings):
     # Create a test configuration with a unique table name
     test_table_name = "test_drop_country_code_table"
-    test_system_table_name = "test_drop_system_table"
+    test_system_table_name = "test_drop_country_code_system_table"
     system_config = SystemStoreConfig(postgres_table=test_system_table_name)
     config = CountryCodeRepoConfig(postgres_table=test_table_name)
     repo = CountryCodeRepo(config, system_config)
@@ -45,7 +44,7 @@ async def test_drop_country_code_repo():
     # First, create some test data in the vector store
     meta_columns = [{"name": "test_column", "data_type": "text", "nullable": True}]
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
+        embeddings=embeddings,
         table_name=test_table_name,
         content_column="name",
         metadata_columns=meta_columns
@@ -80,7 +79,7 @@ async def test_drop_country_code_repo():
     
     # Verify that the vector store table is gone by trying to query it
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
+        embeddings=embeddings,
         table_name=test_table_name,
         content_column="name",
         metadata_columns=meta_columns
@@ -94,3 +93,38 @@ async def test_drop_country_code_repo():
     # Clean up by dropping the newly created table
     await vector_store.drop()
     await vector_store.close()
+
+
+@pytest.mark.asyncio
+async def test_find_exact_country_code():
+    config = CountryCodeRepoConfig(postgres_table="test_exact_country_code_table")
+    system_config = SystemStoreConfig(postgres_table="test_exact_country_code_system_table")
+    repo = CountryCodeRepo(config, system_config)
+    await repo.fetch_country_codes()
+
+    # Names match case-insensitively and ignore surrounding whitespace
+    result = await repo.find_exact_country_code("  united states ", is_reporter=True)
+    assert result is not None
+    assert result["content"] == "United States"
+    assert result["metadata"]["countrycode"] == "840"
+    assert result["metadata"]["iso3Code"] == "USA"
+    # name is the content column, so it is not repeated in metadata
+    assert 'name' not in result["metadata"]
+
+    # The reporter flag filters like the embedding search does
+    assert await repo.find_exact_country_code("United States", is_reporter=False) is None
+    assert (await repo.find_exact_country_code("Iraq", is_reporter=False))["metadata"]["countrycode"] == "368"
+
+    # Unknown names fall through to the embedding search
+    assert await repo.find_exact_country_code("Atlantis", is_reporter=True) is None
+
+    # The index is built from the loaded rows again once they change
+    assert repo._name_index is not None
+    await repo.drop()
+    assert repo._name_index is None
+
+    # Clean up test data
+    system_store = SystemStore(system_config)
+    await system_store.connect()
+    await system_store.drop()
+    await system_store.close()
@@ -1,15 +1,15 @@
 import pytest
 from backend.tariff.config import HSCodeRepoConfig
 from backend.tariff.hs_code_repo import HSCodeRepo
+from backend.tariff.base_repo import parse_wits_items
 from backend.vector_store.vector_store import VectorStore
 from backend.system_store.system_store import SystemStore, SystemStoreConfig
-from langchain_community.embeddings import HuggingFaceEmbeddings
 
 
 @pytest.mark.asyncio
 async def test_store_and_found_hs_code() -> str:
     config = HSCodeRepoConfig(postgres_table="test_hs_code_table")
-    system_config = SystemStoreConfig(postgres_table="test_system_table")
+    system_config = SystemStoreConfig(postgres_table="test_hs_code_system_table")
     repo = HSCodeRepo(config, system_config)
     result = await repo.fetch_hs_codes()
     results = await repo.find_hs_codes("wireless earbuds")
@@ -33,10 +33,10 @@ async def test_store_and_found_hs_code() -> str:
 
 
 @pytest.mark.asyncio
-async def test_drop_hs_code_repo():
+async def test_drop_hs_code_repo(embeddings):
     # Create a test configuration with a unique table name
     test_table_name = "test_drop_hs_code_table"
-    test_system_table_name = "test_drop_system_table"
+    test_system_table_name = "test_drop_hs_code_system_table"
     system_config = SystemStoreConfig(postgres_table=test_system_table_name)
     config = HSCodeRepoConfig(postgres_table=test_table_name)
     repo = HSCodeRepo(config, system_config)
@@ -44,7 +44,7 @@ async def test_drop_hs_code_repo():
     # First, create some test data in the vector store
     meta_columns = [{"name": "test_column", "data_type": "text", "nullable": True}]
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
+        embeddings=embeddings,
         table_name=test_table_name,
         content_column="productdescription",
         metadata_columns=meta_columns
@@ -79,7 +79,7 @@ async def test_drop_hs_code_repo():
     
     # Verify that the vector store table is gone by trying to query it
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
+        embeddings=embeddings,
         table_name=test_table_name,
         content_column="productdescription",
         metadata_columns=meta_columns
@@ -93,3 +93,20 @@ async def test_drop_hs_code_repo():
     # Clean up by dropping the newly created table
     await vector_store.drop()
     await vector_store.close()
+
+
+def test_parse_hs_codes():
+    xml_data = """<?xml version="1.0" encoding="utf-8"?>
+    <wits:datasource xmlns:wits="http://wits.worldbank.org/">
+        <wits:products>
+            <wits:product productcode="851830" isgroup="No" nomenclaturecode="HS" grouptype="N/A">
+                <wits:productdescription>Headphones and earphones</wits:productdescription>
+            </wits:product>
+        </wits:products>
+    </wits:datasource>
+    """
+    df = parse_wits_items(xml_data.encode(), HSCodeRepo.SCHEMA)
+
+    # Every field of a WITS product is loaded, a field dropped from the schema would lose its metadata column
+    assert list(df.columns) == ["productcode", "isgroup", "nomenclaturecode", "grouptype", "productdescription"]
+    assert df.iloc[0].tolist() == ["851830", "No", "HS", "N/A", "Headphones and earphones"]
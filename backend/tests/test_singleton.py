@@ -1,17 +1,20 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytest
-from unittest.mock import MagicMock
-import sys
-import os
-
-# Add the parent directory to sys.path to make imports work
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from unittest.mock import MagicMock, AsyncMock
 from backend.utils.singleton import singleton_cache
 
 
 def test_function_called_once_with_non_none_result():
     """Test that the function is called only once when it returns a non-None result."""
-    mock_func = MagicMock(return_value="test_result")
-    decorated_func = singleton_cache(mock_func)
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        return "test_result"
+
+    decorated_func = singleton_cache(func)
 
     # Call the decorated function multiple times
     result1 = decorated_func()
@@ -19,7 +22,7 @@ def test_function_called_once_with_non_none_result():
     result3 = decorated_func()
 
     # Assert that the original function was called only once
-    assert mock_func.call_count == 1
+    assert len(calls) == 1
     
     # Assert that all calls return the same result
     assert result1 == "test_result"
@@ -29,8 +32,13 @@ def test_function_called_once_with_non_none_result():
 
 def test_function_called_multiple_times_with_none_result():
     """Test that the function is called multiple times when it returns None."""
-    mock_func = MagicMock(return_value=None)
-    decorated_func = singleton_cache(mock_func)
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        return None
+
+    decorated_func = singleton_cache(func)
 
     # Call the decorated function multiple times
     result1 = decorated_func()
@@ -38,7 +46,7 @@ def test_function_called_multiple_times_with_none_result():
     result3 = decorated_func()
 
     # Assert that the original function was called multiple times
-    assert mock_func.call_count == 3
+    assert len(calls) == 3
     
     # Assert that all calls return None
     assert result1 is None
@@ -105,20 +113,155 @@ def test_multiple_decorated_functions():
 
 
 def test_with_args_and_kwargs():
-    """Test that the decorator works with functions that take arguments."""
-    mock_func = MagicMock(return_value="result_with_args")
-    decorated_func = singleton_cache(mock_func)
+    """Test that the value is cached per set of arguments."""
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        return f"result_{args}_{kwargs}"
+
+    decorated_func = singleton_cache(func)
     
     # Call with arguments
     result = decorated_func(1, 2, key="value")
     
     # Assert function was called with correct arguments
-    mock_func.assert_called_once_with(1, 2, key="value")
-    assert result == "result_with_args"
+    assert calls == [((1, 2), {"key": "value"})]
+    assert result == "result_(1, 2)_{'key': 'value'}"
     
-    # Call again with different arguments
-    result2 = decorated_func(3, 4, key="different")
+    # The same arguments return the cached value
+    assert decorated_func(1, 2, key="value") == result
+    assert len(calls) == 1
     
-    # Function should not be called again regardless of different args
-    assert mock_func.call_count == 1
-    assert result2 == "result_with_args"
+    # Different arguments are not served the value cached for other ones
+    result2 = decorated_func(3, 4, key="different")
+    assert len(calls) == 2
+    assert result2 == "result_(3, 4)_{'key': 'different'}"
+    assert decorated_func(1, 2, key="value") == result
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_coroutine_function_result_cached():
+    """Test that the awaited result of a coroutine function is cached."""
+    mock_func = AsyncMock(side_effect=[None, "async_result", "should_not_be_called"])
+    decorated_func = singleton_cache(mock_func)
+
+    # None results are not cached
+    assert await decorated_func() is None
+
+    # The first non-None result is cached and returned on later calls
+    assert await decorated_func() == "async_result"
+    assert await decorated_func() == "async_result"
+    assert mock_func.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_coroutine_calls_run_function_once():
+    """Test that concurrent first calls of a coroutine function await it only once."""
+    calls = []
+
+    async def func():
+        calls.append(None)
+        # Let the other callers reach the cache while this call is in progress
+        await asyncio.sleep(0)
+        return "async_result"
+
+    decorated_func = singleton_cache(func)
+    results = await asyncio.gather(*(decorated_func() for _ in range(5)))
+
+    assert results == ["async_result"] * 5
+    assert len(calls) == 1
+
+
+def test_concurrent_thread_calls_run_function_once():
+    """Test that concurrent first calls from several threads run the function only once."""
+    calls = []
+    started = threading.Event()
+
+    def func():
+        calls.append(None)
+        # Hold the first call until the other threads are waiting for it
+        started.wait(timeout=1)
+        return "result"
+
+    decorated_func = singleton_cache(func)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(decorated_func) for _ in range(4)]
+        started.set()
+        results = [future.result() for future in futures]
+
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+
+
+def test_cache_clear():
+    """Test that cache_clear drops the cached value, so the next call creates a new one."""
+    calls = []
+
+    def func():
+        calls.append(None)
+        return object()
+
+    decorated_func = singleton_cache(func)
+    first = decorated_func()
+    decorated_func.cache_clear()
+    second = decorated_func()
+
+    assert first is not second
+    assert decorated_func() is second
+    assert len(calls) == 2
+
+
+def test_cache_peek():
+    """Test that cache_peek returns the cached value without calling the function."""
+    calls = []
+
+    def func(key):
+        calls.append(key)
+        return f"result_{key}"
+
+    decorated_func = singleton_cache(func)
+    assert decorated_func.cache_peek("a") is None
+    assert calls == []
+
+    decorated_func("a")
+    assert decorated_func.cache_peek("a") == "result_a"
+    assert decorated_func.cache_peek("b") is None
+    assert calls == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_coroutine_calls_with_other_arguments_run_concurrently():
+    """Test that a call in progress does not hold up the first call with other arguments."""
+    release = asyncio.Event()
+
+    async def func(key):
+        if key == "slow":
+            await release.wait()
+        return f"result_{key}"
+
+    decorated_func = singleton_cache(func)
+    slow = asyncio.ensure_future(decorated_func("slow"))
+    await asyncio.sleep(0)
+
+    assert await asyncio.wait_for(decorated_func("fast"), timeout=1) == "result_fast"
+    release.set()
+    assert await slow == "result_slow"
+
+
+def test_coroutine_function_used_from_several_event_loops():
+    """Test that a decorated coroutine function can be called from one event loop after another."""
+    calls = []
+
+    async def func(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return f"result_{key}"
+
+    decorated_func = singleton_cache(func)
+
+    assert asyncio.run(decorated_func("a")) == "result_a"
+    assert asyncio.run(decorated_func("b")) == "result_b"
+    assert asyncio.run(decorated_func("a")) == "result_a"
+    assert calls == ["a", "b"]
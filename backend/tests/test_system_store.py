@@ -1,71 +1,126 @@
+import os
 import pytest
 import asyncio
-import json
 from typing import Dict, Any
 
+import asyncpg
+import orjson
 import pytest_asyncio
 
 from backend.system_store.system_store import SystemStore
 from backend.system_store.config import SystemStoreConfig
 
 
+# Each pytest-xdist worker gets a table of its own, so tests of this module can run in parallel
+TEST_TABLE = f"test_items_table_{os.environ.get('PYTEST_XDIST_WORKER', 'gw0')}"
+
+
 class TestSystemStoreConfig(SystemStoreConfig):
     """Custom config for testing that uses a dedicated test table."""
-    postgres_table: str = "test_items_table"
+    postgres_table: str = TEST_TABLE
+
+
+# Catalog lookups for the test table, bound as $1; to_regclass resolves it to an oid,
+# or NULL if it does not exist, without going through the information_schema views
+TABLE_EXISTS_QUERY = "SELECT to_regclass('public.' || $1::text) IS NOT NULL"
+COLUMNS_QUERY = """
+    SELECT attname AS column_name, format_type(atttypid, atttypmod) AS data_type, NOT attnotnull AS is_nullable
+    FROM pg_attribute
+    WHERE attrelid = to_regclass('public.' || $1::text) AND attnum > 0 AND NOT attisdropped
+    ORDER BY attnum
+"""
+PRIMARY_KEY_QUERY = "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass('public.' || $1::text) AND contype = 'p'"
+UNIQUE_QUERY = "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass('public.' || $1::text) AND contype = 'u'"
+
+# Queries on the test table, formatted once so every test sends the same statement text
+# and the connections' statement caches prepare each of them only once
+TRUNCATE_QUERY = f"TRUNCATE {TEST_TABLE} RESTART IDENTITY"
+SELECT_ITEM_QUERY = f"SELECT key, value FROM {TEST_TABLE} WHERE key = $1"
+COUNT_KEY_QUERY = f"SELECT COUNT(*) FROM {TEST_TABLE} WHERE key = $1"
+COUNT_KEY_PREFIX_QUERY = f"SELECT COUNT(*) FROM {TEST_TABLE} WHERE key LIKE $1 || '%'"
+
+
+def json_equal(a: Any, b: Any) -> bool:
+    """Compare two JSON values through their canonical serialization, in a single bytes comparison."""
+    return orjson.dumps(a, option=orjson.OPT_SORT_KEYS) == orjson.dumps(b, option=orjson.OPT_SORT_KEYS)
     
 
-@pytest_asyncio.fixture
-async def system_store(monkeypatch):
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def pg_pool():
+    """
+    Connection pool shared by the whole test session, with the store's JSONB codec.
+    """
+    pool = await asyncpg.create_pool(
+        dsn=SystemStore(TestSystemStoreConfig()).dsn,
+        min_size=2,
+        # Kept small, as with pytest-xdist every worker opens a pool of its own
+        max_size=4,
+        max_inactive_connection_lifetime=0,
+        init=SystemStore._init_connection
+    )
+    yield pool
+    await pool.close()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def session_system_store(pg_pool):
     """
-    Fixture for SystemStore instance that connects to the actual PostgreSQL database
+    Fixture for a SystemStore instance that connects to the actual PostgreSQL database
     and uses a dedicated test table.
     
-    This is an integration test fixture that creates a temporary test table
-    and drops it after the tests are complete.
+    The pool is opened and the test table created once for the whole session,
+    the table is dropped when the session ends.
     """
-    # Create a test config instance
-    test_config = TestSystemStoreConfig()
-    
-    # Create a store with our test configuration
-    store = SystemStore(test_config)
+    # Create a store with our test configuration on the session pool, this creates the table
+    store = await SystemStore.from_pool(pg_pool, TestSystemStoreConfig())
     
-    # Connect to the database
-    await store.connect()
-    
-    # The table should be created by the connect method
     yield store
     
     try:
         # After tests complete, drop the test table
-        if store.pool:
-            async with store.pool.acquire() as conn:
-                await conn.execute(f"DROP TABLE IF EXISTS {store.store_table}")
-                print(f"Test table {store.store_table} dropped successfully")
+        await store.drop()
     except Exception as e:
         print(f"Error dropping test table: {e}")
     finally:
-        # Close the database connection
+        # Detach the store, the pool is closed by its own fixture
         await store.close()
 
 
-@pytest.mark.asyncio
+@pytest_asyncio.fixture(loop_scope="session")
+async def system_store(session_system_store):
+    """
+    The session store, with the test table emptied before each test.
+    
+    The store writes through its own pool connections, and some tests run operations
+    concurrently or expect statements to fail, so a test cannot be wrapped in a single
+    transaction to roll back. A TRUNCATE is one statement and keeps the table itself.
+    Emptying it up front also clears rows left over by an interrupted earlier run.
+    """
+    await session_system_store._execute(TRUNCATE_QUERY)
+    yield session_system_store
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def system_store_isolated(session_system_store):
+    """
+    The session store for tests that change the schema, the test table is recreated after them.
+    """
+    yield session_system_store
+    await session_system_store._execute(session_system_store._q_create)
+
+
+@pytest.mark.asyncio(loop_scope="session")
 async def test_table_created(system_store):
     """
     Test that verifies the test table was created properly.
     """
     async with system_store.pool.acquire() as conn:
         # Check if the test table exists
-        table_exists = await conn.fetchval(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = '{system_store.store_table}'
-            )
-        """)
+        table_exists = await conn.fetchval(TABLE_EXISTS_QUERY, system_store.store_table)
         assert table_exists is True, f"Test table {system_store.store_table} was not created"
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_add_and_get_item(system_store):
     """
     Integration test for adding and retrieving an item from the database.
@@ -84,7 +139,7 @@ async def test_add_and_get_item(system_store):
     assert retrieved_value == test_value
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_get_nonexistent_item(system_store):
     """
     Integration test for getting an item that doesn't exist.
@@ -96,7 +151,7 @@ async def test_get_nonexistent_item(system_store):
     assert result is None
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_add_duplicate_key(system_store):
     """
     Integration test for adding an item with a duplicate key.
@@ -122,7 +177,7 @@ async def test_add_duplicate_key(system_store):
     assert retrieved_value == test_value_1
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_add_and_get_complex_item(system_store):
     """
     Integration test for adding and retrieving a complex nested item.
@@ -156,7 +211,7 @@ async def test_add_and_get_complex_item(system_store):
     retrieved_value = await system_store.get_item(test_key)
     
     # Check that the retrieved value matches the original complex structure
-    assert retrieved_value == test_value
+    assert json_equal(retrieved_value, test_value)
     
     # Check specific nested elements to be sure
     assert retrieved_value["metadata"]["creator"] == "integration_test"
@@ -164,7 +219,7 @@ async def test_add_and_get_complex_item(system_store):
     assert retrieved_value["data"][0]["tags"] == ["test", "integration"]
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_multiple_items(system_store):
     """
     Integration test for adding and retrieving multiple items.
@@ -176,17 +231,18 @@ async def test_multiple_items(system_store):
         "test_multi_3": {"id": 3, "name": "Third"}
     }
     
-    # Add all items
-    for key, value in items.items():
-        await system_store.add_item(key, value)
+    # Add all items in one batch
+    await system_store.add_items(items)
     
-    # Retrieve and verify each item
-    for key, expected_value in items.items():
-        retrieved_value = await system_store.get_item(key)
-        assert retrieved_value == expected_value
+    # Retrieve all items with one query and verify each of them
+    assert await system_store.get_items(items.keys()) == items
 
+    # Keys that do not exist are left out, and no keys need no query
+    assert await system_store.get_items(["test_multi_1", "test_multi_missing"]) == {"test_multi_1": items["test_multi_1"]}
+    assert await system_store.get_items([]) == {}
 
-@pytest.mark.asyncio
+
+@pytest.mark.asyncio(loop_scope="session")
 async def test_direct_sql_verification(system_store):
     """
     Integration test that directly verifies the database state using SQL.
@@ -201,7 +257,7 @@ async def test_direct_sql_verification(system_store):
     # Verify directly with SQL query
     async with system_store.pool.acquire() as conn:
         # Query the database directly
-        result = await conn.fetchrow(f"SELECT key, value FROM {system_store.store_table} WHERE key = $1", test_key)
+        result = await conn.fetchrow(SELECT_ITEM_QUERY, test_key)
         
         # Check that the result exists
         assert result is not None
@@ -209,77 +265,56 @@ async def test_direct_sql_verification(system_store):
         # Check the key
         assert result["key"] == test_key
         
-        # Check the value (PostgreSQL returns JSONB as a string)
-        db_value = json.loads(result["value"])
+        # Check the value (the pool's JSONB codec decodes it to a dict)
+        db_value = result["value"]
         assert db_value == test_value
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_database_structure(system_store):
     """
     Integration test to verify the database structure created by the connect method.
     """
-    # Verify the test table exists and has the expected structure
-    async with system_store.pool.acquire() as conn:
+    # The checks are independent, so run them at the same time;
+    # the pool shortcuts acquire a separate connection for each query
+    pool = system_store.pool
+    table_exists, columns, pk_constraint, unique_constraint = await asyncio.gather(
         # Check if table exists
-        table_exists = await conn.fetchval(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = '{system_store.store_table}'
-            )
-        """)
-        assert table_exists is True
-        
+        pool.fetchval(TABLE_EXISTS_QUERY, system_store.store_table),
         # Check columns and their data types
-        columns = await conn.fetch(f"""
-            SELECT column_name, data_type, is_nullable
-            FROM information_schema.columns
-            WHERE table_schema = 'public' AND table_name = '{system_store.store_table}'
-            ORDER BY ordinal_position
-        """)
-        
-        # Convert to a more testable format
-        column_info = {row['column_name']: {
-            'data_type': row['data_type'],
-            'is_nullable': row['is_nullable']
-        } for row in columns}
-        
-        # Verify the expected columns exist with correct types
-        assert 'id' in column_info
-        assert column_info['id']['data_type'] == 'integer'
-        assert column_info['id']['is_nullable'] == 'NO'
-        
-        assert 'key' in column_info
-        assert column_info['key']['data_type'] == 'text'
-        assert column_info['key']['is_nullable'] == 'NO'
-        
-        assert 'value' in column_info
-        assert column_info['value']['data_type'] == 'jsonb'
-        assert column_info['value']['is_nullable'] == 'NO'
-        
+        pool.fetch(COLUMNS_QUERY, system_store.store_table),
         # Check primary key constraint
-        pk_constraint = await conn.fetchval(f"""
-            SELECT constraint_name
-            FROM information_schema.table_constraints
-            WHERE table_schema = 'public' 
-            AND table_name = '{system_store.store_table}'
-            AND constraint_type = 'PRIMARY KEY'
-        """)
-        assert pk_constraint is not None
-        
+        pool.fetchval(PRIMARY_KEY_QUERY, system_store.store_table),
         # Check unique constraint on the key column
-        unique_constraint = await conn.fetchval(f"""
-            SELECT constraint_name
-            FROM information_schema.table_constraints
-            WHERE table_schema = 'public' 
-            AND table_name = '{system_store.store_table}'
-            AND constraint_type = 'UNIQUE'
-        """)
-        assert unique_constraint is not None
+        pool.fetchval(UNIQUE_QUERY, system_store.store_table)
+    )
+
+    assert table_exists is True
+    
+    # Convert to a more testable format
+    column_info = {row['column_name']: {
+        'data_type': row['data_type'],
+        'is_nullable': row['is_nullable']
+    } for row in columns}
+    
+    # Verify the expected columns exist with correct types
+    assert 'id' in column_info
+    assert column_info['id']['data_type'] == 'integer'
+    assert column_info['id']['is_nullable'] is False
+    
+    assert 'key' in column_info
+    assert column_info['key']['data_type'] == 'text'
+    assert column_info['key']['is_nullable'] is False
+    
+    assert 'value' in column_info
+    assert column_info['value']['data_type'] == 'jsonb'
+    assert column_info['value']['is_nullable'] is False
+    
+    assert pk_constraint is not None
+    assert unique_constraint is not None
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_upsert_item(system_store):
     """
     Integration test for upsert_item method.
@@ -295,20 +330,20 @@ async def test_upsert_item(system_store):
     
     # Verify the item was inserted correctly
     retrieved_value = await system_store.get_item(test_key)
-    assert retrieved_value == initial_value
+    assert json_equal(retrieved_value, initial_value)
     
     # 2. Now update the existing item
     await system_store.upsert_item(test_key, updated_value)
     
     # Verify the item was updated
     retrieved_value = await system_store.get_item(test_key)
-    assert retrieved_value == updated_value
+    assert json_equal(retrieved_value, updated_value)
     assert retrieved_value != initial_value
     
     # 3. Directly verify using SQL query
     async with system_store.pool.acquire() as conn:
         # Query the database directly
-        result = await conn.fetchrow(f"SELECT key, value FROM {system_store.store_table} WHERE key = $1", test_key)
+        result = await conn.fetchrow(SELECT_ITEM_QUERY, test_key)
         
         # Check that the result exists
         assert result is not None
@@ -316,16 +351,45 @@ async def test_upsert_item(system_store):
         # Check the key
         assert result["key"] == test_key
         
-        # Check the value (PostgreSQL returns JSONB as a string)
-        db_value = json.loads(result["value"])
-        assert db_value == updated_value
+        # Check the value (the pool's JSONB codec decodes it to a dict)
+        db_value = result["value"]
+        assert json_equal(db_value, updated_value)
         
         # Verify only one row exists for this key (no duplicates)
-        count = await conn.fetchval(f"SELECT COUNT(*) FROM {system_store.store_table} WHERE key = $1", test_key)
+        count = await conn.fetchval(COUNT_KEY_QUERY, test_key)
+        assert count == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_upsert_items(system_store):
+    """
+    Integration test for upsert_items method.
+    Tests that a batch inserts new items and updates existing ones in one call.
+    """
+    # Seed one item that the batch will overwrite
+    await system_store.add_item("test_batch_1", {"version": 1})
+
+    items = {
+        "test_batch_1": {"version": 2},
+        "test_batch_2": {"version": 1, "tags": ["new"]},
+        "test_batch_3": {"version": 1, "nested": {"enabled": True}}
+    }
+    await system_store.upsert_items(items)
+
+    # Verify every item in the batch is stored with its latest value
+    for key, expected_value in items.items():
+        assert await system_store.get_item(key) == expected_value
+
+    # An empty batch should be a no-op
+    await system_store.upsert_items({})
+
+    # Verify no duplicate rows were created for the overwritten key
+    async with system_store.pool.acquire() as conn:
+        count = await conn.fetchval(COUNT_KEY_QUERY, "test_batch_1")
         assert count == 1
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_concurrent_operations(system_store):
     """
     Integration test for concurrent operations to verify connection pool handling.
@@ -343,8 +407,8 @@ async def test_concurrent_operations(system_store):
     async def add_and_get(key, value):
         # Add the item
         await system_store.add_item(key, value)
-        # Small delay to simulate workload
-        await asyncio.sleep(0.01)
+        # Yield to the event loop so the other operations interleave with this one
+        await asyncio.sleep(0)
         # Retrieve the item
         retrieved = await system_store.get_item(key)
         return key, retrieved
@@ -355,18 +419,15 @@ async def test_concurrent_operations(system_store):
     
     # Verify all operations were successful
     for key, retrieved in results:
-        assert retrieved == test_items[key]
+        assert json_equal(retrieved, test_items[key])
     
     # Verify the count in the database
     async with system_store.pool.acquire() as conn:
-        count = await conn.fetchval(f"""
-            SELECT COUNT(*) FROM {system_store.store_table}
-            WHERE key LIKE 'test_concurrent_%'
-        """)
+        count = await conn.fetchval(COUNT_KEY_PREFIX_QUERY, "test_concurrent_")
         assert count == num_operations
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_delete_item(system_store):
     """
     Integration test for delete_item method.
@@ -392,7 +453,7 @@ async def test_delete_item(system_store):
     
     # 4. Directly verify using SQL query that the item no longer exists
     async with system_store.pool.acquire() as conn:
-        count = await conn.fetchval(f"SELECT COUNT(*) FROM {system_store.store_table} WHERE key = $1", test_key)
+        count = await conn.fetchval(COUNT_KEY_QUERY, test_key)
         assert count == 0
     
     # 5. Test deleting a non-existent item (should not raise an exception)
@@ -418,31 +479,75 @@ async def test_delete_item(system_store):
     assert await system_store.get_item(keys[2]) is not None
 
 
-@pytest.mark.asyncio
-async def test_drop_table(system_store):
+@pytest.mark.asyncio(loop_scope="session")
+async def test_drop_table(system_store_isolated):
     """
     Integration test for the drop function that removes the table.
     """
+    system_store = system_store_isolated
+
     # Create the table if it doesn't exist
-    await system_store._execute(f"""
-        CREATE TABLE IF NOT EXISTS {system_store.store_table} (
-            id SERIAL PRIMARY KEY,
-            key TEXT UNIQUE NOT NULL,
-            value JSONB NOT NULL
-        )
-    """)
+    await system_store._execute(system_store._q_create)
     
     # Call the drop function
     await system_store.drop()
     
     # Verify the table no longer exists
     async with system_store.pool.acquire() as conn:
-        table_exists_after = await conn.fetchval(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = '{system_store.store_table}'
-            )
-        """)
+        table_exists_after = await conn.fetchval(TABLE_EXISTS_QUERY, system_store.store_table)
         assert table_exists_after is False, f"Test table {system_store.store_table} should not exist after drop"
 
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stores_share_pool(system_store):
+    """
+    Integration test that stores connected to the same database share one pool,
+    which stays open until the last of them is closed.
+    """
+    first_store = SystemStore(TestSystemStoreConfig())
+    second_store = SystemStore(TestSystemStoreConfig())
+    await first_store.connect()
+    await second_store.connect()
+    shared_pool = first_store.pool
+
+    try:
+        assert second_store.pool is shared_pool
+        # A store created from a pool keeps to that pool
+        assert system_store.pool is not shared_pool
+
+        # Closing one store keeps the pool usable for the other
+        await first_store.close()
+        assert first_store.pool is None
+        await second_store.upsert_item("shared_pool_key", {"value": 1})
+        assert await second_store.get_item("shared_pool_key") == {"value": 1}
+    finally:
+        await first_store.close()
+        await second_store.close()
+
+    assert shared_pool.is_closing()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stores_with_other_pool_settings_do_not_share_pool(system_store):
+    """
+    Integration test that a store configured with other pool settings gets its own pool,
+    and that dropping a table leaves the connections of the other stores' pools alone.
+    """
+    first_store = SystemStore(TestSystemStoreConfig())
+    second_store = SystemStore(TestSystemStoreConfig(pool_max_size=2))
+    await first_store.connect()
+    await second_store.connect()
+
+    try:
+        assert second_store.pool is not first_store.pool
+        assert second_store.pool.get_max_size() == 2
+
+        await first_store.upsert_item("pool_settings_key", {"value": 1})
+        await second_store.drop()
+        await second_store._execute(second_store._q_create)
+        # The first store's cached statements still work against the recreated table
+        await first_store.upsert_item("pool_settings_key", {"value": 2})
+        assert await first_store.get_item("pool_settings_key") == {"value": 2}
+    finally:
+        await first_store.close()
+        await second_store.close()
@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from backend.utils.ttl_cache import async_ttl_cache
+
+
+@pytest.mark.asyncio
+async def test_result_cached_per_arguments():
+    """Test that the coroutine is awaited once per distinct set of arguments."""
+    mock_func = AsyncMock(side_effect=lambda key: f"result_{key}")
+    decorated_func = async_ttl_cache(ttl=60)(mock_func)
+
+    assert await decorated_func("a") == "result_a"
+    assert await decorated_func("a") == "result_a"
+    assert await decorated_func("b") == "result_b"
+
+    # One call for "a" and one for "b"
+    assert mock_func.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_none_result_not_cached():
+    """Test that None results are not cached."""
+    mock_func = AsyncMock(side_effect=[None, "final_result", "should_not_be_called"])
+    decorated_func = async_ttl_cache(ttl=60)(mock_func)
+
+    assert await decorated_func() is None
+    assert await decorated_func() == "final_result"
+    assert await decorated_func() == "final_result"
+    assert mock_func.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_entry_expires_after_ttl():
+    """Test that a cached value is refreshed once its ttl has elapsed."""
+    mock_func = AsyncMock(side_effect=["first", "second"])
+    decorated_func = async_ttl_cache(ttl=10)(mock_func)
+
+    with patch("backend.utils.ttl_cache.time.monotonic", return_value=100.0):
+        assert await decorated_func() == "first"
+    with patch("backend.utils.ttl_cache.time.monotonic", return_value=109.0):
+        assert await decorated_func() == "first"
+    with patch("backend.utils.ttl_cache.time.monotonic", return_value=110.0):
+        assert await decorated_func() == "second"
+
+    assert mock_func.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entry_evicted_at_maxsize():
+    """Test that the least recently used entry is evicted when the cache is full."""
+    mock_func = AsyncMock(side_effect=lambda key: f"result_{key}")
+    decorated_func = async_ttl_cache(ttl=60, maxsize=2)(mock_func)
+
+    await decorated_func("a")
+    await decorated_func("b")
+    await decorated_func("a")  # Cache hit, "b" becomes least recently used
+    await decorated_func("c")  # Evicts "b"
+    await decorated_func("a")  # Still cached
+    await decorated_func("b")  # Awaited again
+
+    assert mock_func.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_cache_clear():
+    """Test that cache_clear drops all cached values."""
+    mock_func = AsyncMock(return_value="result")
+    decorated_func = async_ttl_cache(ttl=60)(mock_func)
+
+    await decorated_func()
+    decorated_func.cache_clear()
+    await decorated_func()
+
+    assert mock_func.await_count == 2
+
+
+def test_function_preserves_metadata():
+    """Test that the decorator preserves function metadata like __name__ and __doc__."""
+
+    @async_ttl_cache(ttl=60)
+    async def test_function():
+        """Test docstring."""
+        return "result"
+
+    assert test_function.__name__ == "test_function"
+    assert test_function.__doc__ == "Test docstring."
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_call():
+    """Test that concurrent calls with the same arguments await the coroutine once."""
+    calls = []
+
+    async def func(key):
+        calls.append(key)
+        # Let the other callers reach the cache while this call is in progress
+        await asyncio.sleep(0)
+        return f"result_{key}"
+
+    decorated_func = async_ttl_cache(ttl=60)(func)
+    results = await asyncio.gather(*(decorated_func("a") for _ in range(5)), decorated_func("b"))
+
+    assert results == ["result_a"] * 5 + ["result_b"]
+    assert calls == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_call_in_progress_not_cached_after_cache_clear():
+    """Test that a result computed from before cache_clear is returned but not cached."""
+    mock_func = AsyncMock(side_effect=["stale", "fresh"])
+    decorated_func = async_ttl_cache(ttl=60)(mock_func)
+
+    call = asyncio.ensure_future(decorated_func())
+    await asyncio.sleep(0)
+    decorated_func.cache_clear()
+    assert await call == "stale"
+
+    assert await decorated_func() == "fresh"
+    assert mock_func.await_count == 2
@@ -1,18 +1,18 @@
 import pytest
+import numpy as np
 import pandas as pd
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
-from backend.vector_store.vector_store import VectorStore
+from backend.vector_store.vector_store import VectorStore, MetadataColumn
 from langchain_postgres import Column
 
 @pytest.mark.asyncio
-async def test_add_documents_to_vector_store():
+async def test_add_documents_to_vector_store(embeddings):
     metadata_columns = [
         {"name": "metadata1", "data_type": "text", "nullable": True},
         {"name": "metadata2", "data_type": "text", "nullable": True}
     ]
 
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"), 
+        embeddings=embeddings, 
         table_name="test_table",
         content_column="content",
         metadata_columns=metadata_columns
@@ -42,20 +42,36 @@ async def test_add_documents_to_vector_store():
     results = await vector_store.find_content("doc1", top_k=1, filter={"metadata1": {"$eq": "not_exist"}})
     assert len(results) == 0
 
+    # The repeated query was embedded once
+    assert list(vector_store._query_embeddings) == ["doc1"]
+
+    # A per-search ef_search finds the same rows through a store kept for that value
+    results = await vector_store.find_content("doc1", top_k=1, ef_search=20)
+    assert results[0]["content"] == "doc1"
+    results = await vector_store.find_content("doc2", top_k=1, ef_search=20)
+    assert results[0]["content"] == "doc2"
+    assert list(vector_store._tuned_stores) == [20]
+
+    # Values below top_k or above pgvector's limit are rejected
+    with pytest.raises(ValueError):
+        await vector_store.find_content("doc1", top_k=3, ef_search=2)
+    with pytest.raises(ValueError):
+        await vector_store.find_content("doc1", top_k=1, ef_search=5000)
+
     # Drop the table after test
     await vector_store.drop()
     assert vector_store.store is None
 
 
 @pytest.mark.asyncio
-async def test_truncate_store():
+async def test_truncate_store(embeddings):
     metadata_columns = [
         {"name": "metadata1", "data_type": "text", "nullable": True},
         {"name": "metadata2", "data_type": "text", "nullable": True}
     ]
 
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"), 
+        embeddings=embeddings, 
         table_name="truncate_test_table",
         content_column="content",
         metadata_columns=metadata_columns
@@ -88,8 +104,25 @@ async def test_truncate_store():
     await vector_store.drop()
 
 
+def test_dataclass_metadata_columns(embeddings):
+    metadata_columns = [MetadataColumn("content"), MetadataColumn("metadata1"), MetadataColumn("metadata2", nullable=False)]
+
+    vector_store = VectorStore(
+        embeddings=embeddings,
+        table_name="dataclass_columns_test_table",
+        content_column="content",
+        metadata_columns=metadata_columns
+    )
+
+    # Dataclass columns are kept in the dict form the engine expects, without the content column
+    assert vector_store.metadata_columns == [
+        {"name": "metadata1", "data_type": "text", "nullable": True},
+        {"name": "metadata2", "data_type": "text", "nullable": False}
+    ]
+
+
 @pytest.mark.asyncio
-async def test_content_column_not_in_metadata():
+async def test_content_column_not_in_metadata(embeddings):
     # Create metadata columns including one with the same name as the content column
     metadata_columns = [
         {"name": "content", "data_type": "text", "nullable": True},  # Same name as content_column
@@ -98,7 +131,7 @@ async def test_content_column_not_in_metadata():
     ]
 
     vector_store = VectorStore(
-        embeddings=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"), 
+        embeddings=embeddings, 
         table_name="content_column_test_table",
         content_column="content",
         metadata_columns=metadata_columns
@@ -135,3 +168,110 @@ async def test_content_column_not_in_metadata():
     
     # Clean up
     await vector_store.drop()
+
+
+@pytest.mark.asyncio
+async def test_bulk_copy_dataframe(embeddings):
+    metadata_columns = [
+        {"name": "metadata1", "data_type": "text", "nullable": True},
+        {"name": "metadata2", "data_type": "text", "nullable": True}
+    ]
+
+    vector_store = VectorStore(
+        embeddings=embeddings,
+        table_name="bulk_copy_test_table",
+        content_column="content",
+        metadata_columns=metadata_columns
+    )
+    await vector_store.connect()
+
+    df = pd.DataFrame({
+        "content": ["doc1", "doc2", "doc3"],
+        "metadata1": ["meta11", "meta12", "meta13"],
+        "metadata2": ["meta21", None, "meta23"]
+    })
+    embeddings_matrix = np.asarray(embeddings.embed_documents(df["content"].tolist()), dtype=np.float32)
+
+    await vector_store.bulk_copy_dataframe(df, embeddings_matrix)
+
+    results = await vector_store.find_content("doc1", top_k=3)
+    assert len(results) == 3
+    assert results[0]["content"] == "doc1"
+    assert results[0]["metadata"] == {"metadata1": "meta11", "metadata2": "meta21"}
+
+    results = await vector_store.find_content("doc2", top_k=1, filter={"metadata1": {"$eq": "meta12"}})
+    assert len(results) == 1
+    assert results[0]["metadata"] == {"metadata1": "meta12", "metadata2": None}
+
+    # Mismatched row and embedding counts are rejected
+    with pytest.raises(ValueError):
+        await vector_store.bulk_copy_dataframe(df, embeddings_matrix[:2])
+
+    # The stored embeddings can be read back by content, within the precision of the column type
+    stored = await vector_store.find_embeddings(["doc1", "doc3", "not_stored"])
+    assert set(stored) == {"doc1", "doc3"}
+    np.testing.assert_allclose(stored["doc3"], embeddings_matrix[2], atol=1e-3)
+
+    # Clean up
+    await vector_store.drop()
+
+
+@pytest.mark.asyncio
+async def test_replace_dataframe(embeddings):
+    metadata_columns = [
+        {"name": "metadata1", "data_type": "text", "nullable": True}
+    ]
+
+    vector_store = VectorStore(
+        embeddings=embeddings,
+        table_name="replace_test_table",
+        content_column="content",
+        metadata_columns=metadata_columns
+    )
+    await vector_store.connect()
+
+    old_df = pd.DataFrame({"content": ["old1", "old2"], "metadata1": ["meta11", "meta12"]})
+    await vector_store.bulk_copy_dataframe(old_df, np.asarray(embeddings.embed_documents(old_df["content"].tolist()), dtype=np.float32))
+
+    # Replace twice, so the staging table name is reused after a swap
+    for contents in (["new1", "new2", "new3"], ["newer1"]):
+        df = pd.DataFrame({"content": contents, "metadata1": [f"meta_{content}" for content in contents]})
+        await vector_store.replace_dataframe(df, np.asarray(embeddings.embed_documents(contents), dtype=np.float32))
+
+        results = await vector_store.find_content(contents[0], top_k=10)
+        assert sorted(result["content"] for result in results) == sorted(contents)
+        assert results[0]["metadata"] == {"metadata1": f"meta_{contents[0]}"}
+
+    # Clean up
+    await vector_store.drop()
+
+
+@pytest.mark.asyncio
+async def test_outdated_layout_rebuilt(embeddings):
+    vector_store = VectorStore(
+        embeddings=embeddings,
+        table_name="layout_test_table",
+        content_column="content"
+    )
+    await vector_store.connect()
+    assert not await vector_store.layout_outdated()
+
+    df = pd.DataFrame({"content": ["doc1", "doc2"]})
+    await vector_store.bulk_copy_dataframe(df, np.asarray(embeddings.embed_documents(df["content"].tolist()), dtype=np.float32))
+    # Lay the table out as before, with a vector column and no inner product index
+    await vector_store._execute(f'DROP INDEX "{vector_store._index_name(vector_store.table_name)}"')
+    await vector_store._execute(f'ALTER TABLE "{vector_store.table_name}" ALTER COLUMN "embedding" TYPE vector({vector_store.config.vector_size})')
+
+    # Connecting to it does not fail, and searches keep working until it is rebuilt
+    vector_store = VectorStore(embeddings=embeddings, table_name="layout_test_table", content_column="content")
+    await vector_store.connect()
+    assert vector_store.needs_rebuild
+    results = await vector_store.find_content("doc1", top_k=1)
+    assert results[0]["content"] == "doc1"
+
+    await vector_store.replace_dataframe(df, np.asarray(embeddings.embed_documents(df["content"].tolist()), dtype=np.float32))
+    assert not vector_store.needs_rebuild
+    assert not await vector_store.layout_outdated()
+
+    # Clean up
+    await vector_store.drop()
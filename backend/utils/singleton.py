@@ -1,37 +1,93 @@
 from functools import wraps
-from typing import Callable, TypeVar, Any, Optional, Dict
-import uuid
+from typing import Callable, TypeVar, Any, Optional, Dict, Hashable, Tuple
+import asyncio
+import inspect
+import threading
 
 T = TypeVar('T')
 
+# Marks arguments whose value has not been cached yet, as None results are never cached
+_MISS = object()
+
 def singleton_cache(func: Callable[..., Optional[T]]) -> Callable[..., Optional[T]]:
     """
-    A decorator that caches the non-None return value of the function.
-    Subsequent calls to the function will return the cached value directly.
+    A decorator that caches the non-None return value of the function per set of arguments.
+    Subsequent calls with the same arguments will return the cached value directly,
+    so for the zero-argument factories it is mostly used on there is a single instance.
+    Coroutine functions are supported, in which case the awaited result is cached.
+    Concurrent first calls with the same arguments share one call, so the function runs once rather than once per caller.
+    Unlike functools.lru_cache, None results are not cached and coroutine results are awaited once.
     
     Args:
-        func: The function to be decorated
+        func: The function to be decorated, its arguments must be hashable
         
     Returns:
-        A wrapped function that caches the first non-None return value
+        A wrapped function that caches the first non-None return value for each set of arguments
     """
-    # Use a shared dictionary for all cached values with function name as key
-    _cache: Dict[str, Any] = {}
-    
-    # Try to get the function name, fallback to a unique id for mock objects
-    try:
-        cache_key = func.__name__
-    except (AttributeError, TypeError):
-        # For objects without __name__ (like MagicMock in tests)
-        cache_key = f"func_{str(uuid.uuid4())}"
+    # Maps the call arguments to the cached value
+    _cache: Dict[Hashable, Any] = {}
+
+    def cache_peek(*args: Any, **kwargs: Any) -> Optional[T]:
+        """Return the value cached for the arguments, or None, without calling the function."""
+        return _cache.get((args, tuple(sorted(kwargs.items()))) if kwargs else args)
     
+    if inspect.iscoroutinefunction(func):
+        # Calls in progress per event loop and call arguments, awaited by every caller with the same
+        # arguments on that loop. Created in the running loop, so the wrapper works from any loop.
+        _pending: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        # Bumped by cache_clear, so calls started before it do not cache their result
+        _generation = [0]
+
+        async def load(pending_key: Tuple[asyncio.AbstractEventLoop, Hashable], generation: int, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Optional[T]:
+            try:
+                result = await func(*args, **kwargs)
+                if result is not None and generation == _generation[0]:
+                    _cache[pending_key[1]] = result
+                return result
+            finally:
+                if _pending.get(pending_key) is asyncio.current_task():
+                    del _pending[pending_key]
+
+        @wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Optional[T]:
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            cached = _cache.get(key, _MISS)
+            if cached is not _MISS:
+                return cached
+            pending_key = (asyncio.get_running_loop(), key)
+            task = _pending.get(pending_key)
+            if task is None:
+                task = _pending[pending_key] = asyncio.ensure_future(load(pending_key, _generation[0], args, kwargs))
+            # Shielded, so a cancelled caller does not cancel the call the others are waiting for
+            return await asyncio.shield(task)
+
+        def cache_clear():
+            _generation[0] += 1
+            _cache.clear()
+            _pending.clear()
+
+        async_wrapper.cache_clear = cache_clear
+        async_wrapper.cache_peek = cache_peek
+        return async_wrapper
+
+    lock = threading.Lock()
+
     @wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Optional[T]:
-        if cache_key not in _cache:
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        cached = _cache.get(key, _MISS)
+        if cached is not _MISS:
+            return cached
+        with lock:
+            # Another thread may have cached the value while this one waited
+            cached = _cache.get(key, _MISS)
+            if cached is not _MISS:
+                return cached
             result = func(*args, **kwargs)
             if result is not None:
-                _cache[cache_key] = result
+                _cache[key] = result
             return result
-        return _cache[cache_key]
     
+    wrapper.cache_clear = _cache.clear
+    wrapper.cache_peek = cache_peek
     return wrapper
@@ -0,0 +1,67 @@
+from functools import wraps
+from typing import Callable, TypeVar, Any, Optional, Dict, Tuple, Awaitable, Hashable
+import asyncio
+import time
+
+T = TypeVar('T')
+
+def async_ttl_cache(ttl: float, maxsize: int = 512) -> Callable[[Callable[..., Awaitable[Optional[T]]]], Callable[..., Awaitable[Optional[T]]]]:
+    """
+    A decorator that caches the non-None results of a coroutine function per set of
+    arguments for a limited time.
+    Calls with the same arguments within `ttl` seconds return the cached value directly,
+    and concurrent calls with the same arguments share a single call of the function.
+
+    Args:
+        ttl: Number of seconds a cached result stays valid
+        maxsize: Maximum number of cached argument sets, the least recently used entry is evicted first
+
+    Returns:
+        A decorator that wraps a coroutine function with the cache
+    """
+    def decorator(func: Callable[..., Awaitable[Optional[T]]]) -> Callable[..., Awaitable[Optional[T]]]:
+        # Maps the call arguments to (expiry time, cached value)
+        _cache: Dict[Hashable, Tuple[float, Any]] = {}
+        # Calls in progress per call arguments, awaited by every caller with the same arguments
+        _pending: Dict[Hashable, asyncio.Task] = {}
+        # Bumped by cache_clear, so calls started before it do not cache their result
+        _generation = [0]
+
+        async def load(key: Hashable, now: float, generation: int, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Optional[T]:
+            try:
+                result = await func(*args, **kwargs)
+                if result is not None and generation == _generation[0]:
+                    _cache.pop(key, None)
+                    if len(_cache) >= maxsize:
+                        _cache.pop(next(iter(_cache)))
+                    _cache[key] = (now + ttl, result)
+                return result
+            finally:
+                if _pending.get(key) is asyncio.current_task():
+                    del _pending[key]
+
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Optional[T]:
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            entry = _cache.get(key)
+            if entry is not None and entry[0] > now:
+                # Move the entry to the end to keep the dict in least-recently-used order
+                _cache[key] = _cache.pop(key)
+                return entry[1]
+
+            task = _pending.get(key)
+            if task is None:
+                task = _pending[key] = asyncio.ensure_future(load(key, now, _generation[0], args, kwargs))
+            # Shielded, so a cancelled caller does not cancel the call the others are waiting for
+            return await asyncio.shield(task)
+
+        def cache_clear():
+            _generation[0] += 1
+            _cache.clear()
+            _pending.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Literal
 
 class VectorStoreConfig(BaseSettings):
     """
@@ -12,8 +13,24 @@ class VectorStoreConfig(BaseSettings):
     postgres_database: str = Field("air_supply_db", description="Database name")
     postgres_table: str = Field("air_supply_vector_table", description="Database table for vectors")
     vector_size: int = Field(384, description="Size of the vectors")
+    vector_type: Literal["vector", "halfvec"] = Field("halfvec", description="Column type of the stored vectors, 'halfvec' (16-bit floats) or 'vector' (32-bit floats)")
+    hnsw_m: int = Field(24, description="Maximum connections per node of the HNSW index")
+    hnsw_ef_construction: int = Field(128, description="Candidate list size used while building the HNSW index")
+    hnsw_ef_search: int = Field(100, description="Candidate list size used by searches on the HNSW index, higher improves recall")
+    query_embedding_cache_size: int = Field(1024, description="Number of search query embeddings kept in memory, so repeated queries skip the model")
+    index_maintenance_work_mem: str = Field("2GB", description="maintenance_work_mem for building the HNSW index, the build is much faster when the graph fits in it")
 
 
     class Config:
         case_sensitive = False
-        
\ No newline at end of file
+
+
+class EmbeddingsConfig(BaseSettings):
+    """
+    Configuration for the sentence-transformers model used to embed content.
+    """
+    embedding_backend: Literal["torch", "onnx"] = Field("torch", description="Inference backend of the embeddings model, 'torch' or 'onnx' (requires sentence-transformers[onnx])")
+    embedding_onnx_file: str = Field("onnx/model_qint8_avx512_vnni.onnx", description="ONNX export of the model to load with the 'onnx' backend, the default is its INT8 quantized variant")
+
+    class Config:
+        case_sensitive = False
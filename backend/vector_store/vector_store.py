@@ -1,86 +1,398 @@
 from .config import VectorStoreConfig
+from ..utils.singleton import singleton_cache
+import numpy as np
 import pandas as pd
+import psycopg
 import uuid
-from typing import List, Dict, Any
+import asyncio
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, is_dataclass
+from typing import List, Dict, Any, Optional, Union
+from pgvector.utils import HalfVector
+from pgvector.psycopg import register_vector_async
 from langchain_postgres import PGEngine, PGVectorStore, ColumnDict
+from langchain_postgres.v2.indexes import DistanceStrategy, HNSWQueryOptions
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Largest hnsw.ef_search pgvector accepts
+MAX_EF_SEARCH = 1000
+# Number of stores kept for ef_search values other than the configured one
+MAX_TUNED_STORES = 8
+
+@singleton_cache
+def _get_vector_store_config() -> VectorStoreConfig:
+    """Settings read from the environment once, rather than by every store."""
+    return VectorStoreConfig()
+
+@singleton_cache
+def _get_engine(connection_str: str) -> PGEngine:
+    """
+    Engine shared by every store on the same database, so they draw from one connection pool.
+    The engine runs its pool on a background event loop, which makes it usable from any loop.
+    Kept for the process lifetime without eviction, as dropping an engine would leak its open pool.
+    """
+    return PGEngine.from_connection_string(url=connection_str)
+
+
+@dataclass(slots=True, frozen=True)
+class MetadataColumn:
+    """A metadata column of a vector table."""
+    name: str
+    data_type: str = "text"
+    nullable: bool = True
+
 
 class VectorStore:
-    def __init__(self, embeddings: Embeddings, table_name: str, content_column: str, metadata_columns: List[ColumnDict] = None):
-        self.config = VectorStoreConfig()
+    def __init__(self, embeddings: Embeddings, table_name: str, content_column: str, metadata_columns: List[Union[ColumnDict, Any]] = None):
+        self.config = _get_vector_store_config()
         self.connection_str = (
             f"postgresql+asyncpg://{self.config.postgres_user}:{self.config.postgres_password}@{self.config.postgres_host}"
             f":{self.config.postgres_port}/{self.config.postgres_database}"
         )
-        self.pg_engine = PGEngine.from_connection_string(url=self.connection_str)
+        # Plain libpq connection string for the psycopg connection used by bulk loads
+        self.copy_conninfo = (
+            f"postgresql://{self.config.postgres_user}:{self.config.postgres_password}@{self.config.postgres_host}"
+            f":{self.config.postgres_port}/{self.config.postgres_database}"
+        )
+        self.pg_engine = _get_engine(self.connection_str)
         self.embeddings = embeddings
-        # Remove any metadata columns that have the same name as the content column
+        # Remove any metadata columns that have the same name as the content column.
+        # Columns may also be given as dataclasses, they are kept as the ColumnDict the engine expects.
         if metadata_columns:
+            metadata_columns = [asdict(col) if is_dataclass(col) else col for col in metadata_columns]
             self.metadata_columns = [col for col in metadata_columns if col.get('name') != content_column]
         else:
             self.metadata_columns = metadata_columns
+        # Names of the metadata columns, read on every load and store creation
+        self._metadata_names = [col['name'] for col in self.metadata_columns] if self.metadata_columns else []
         self.table_name = table_name
         self.content_column = content_column
+        # Embeddings of recent search queries, least recently used first
+        self._query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Stores over the same table searching with an ef_search other than the configured one
+        self._tuned_stores: "OrderedDict[int, PGVectorStore]" = OrderedDict()
+        # Set by connect when the existing table was laid out for another vector type or distance
+        self.needs_rebuild = False
 
     async def connect(self):
         # Create table if it does not exist, skip if already exists
         try:
-            await self.pg_engine.ainit_vectorstore_table(
-                table_name=self.table_name,
-                vector_size=self.config.vector_size,
-                metadata_columns=self.metadata_columns
-            )
+            await self._create_table()
+            # A new table is empty, so its index is built right away and grows with the inserts
+            await self._execute(self._create_index_statement(self.table_name))
         except Exception as e:
             if "already exists" in str(e) or "duplicate key value" in str(e):
                 pass  # Table already exists, skip
             else:
                 raise
-        self.store = await PGVectorStore.create(
-            engine=self.pg_engine,
-            table_name=self.table_name,
-            embedding_service=self.embeddings,
-            metadata_columns=[col['name'] for col in self.metadata_columns] if self.metadata_columns else None
-        )
+            # Indexing or converting a populated table here would hold up the caller, so an outdated
+            # table keeps serving searches without the index until replace_dataframe rebuilds it
+            self.needs_rebuild = await self.layout_outdated()
+            if self.needs_rebuild:
+                logger.warning("Vector table '%s' is not laid out as configured, it is migrated by the next refresh", self.table_name)
+        await self._create_store()
 
-    async def truncate_store(self):
+    def layout_settings(self) -> Dict[str, Any]:
         """
-        Truncate the vector store table - clears all data while preserving the table structure.
+        Settings the table and its index are built with, a table built with other ones must be rebuilt.
         """
-        # Drop the existing table
-        await self.pg_engine.adrop_table(self.table_name)
-        
-        # Re-create the table with the same structure
+        return {
+            "vector_type": self.config.vector_type,
+            "vector_size": self.config.vector_size,
+            "distance": "inner_product",
+            "hnsw_m": self.config.hnsw_m,
+            "hnsw_ef_construction": self.config.hnsw_ef_construction
+        }
+
+    async def table_exists(self) -> bool:
+        """
+        Whether the table exists in the database.
+        """
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            cur = await conn.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{self.table_name}"',))
+            (exists,) = await cur.fetchone()
+        return exists
+
+    async def layout_outdated(self) -> bool:
+        """
+        Whether the table stores its embeddings in another type than the configured one, or lacks the
+        inner product index, as tables created before these settings do. False if the table does not exist.
+        """
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            cur = await conn.execute(
+                """
+                SELECT format_type(a.atttypid, NULL), EXISTS (
+                    SELECT 1 FROM pg_index i JOIN pg_opclass o ON o.oid = i.indclass[0]
+                    WHERE i.indrelid = a.attrelid AND i.indkey[0] = a.attnum AND o.opcname = %s
+                )
+                FROM pg_attribute a
+                WHERE a.attrelid = to_regclass(%s) AND a.attname = 'embedding'
+                """,
+                (f"{self.config.vector_type}_ip_ops", f'"{self.table_name}"')
+            )
+            row = await cur.fetchone()
+        if row is None:
+            return False
+        vector_type, indexed = row
+        return vector_type != self.config.vector_type or not indexed
+
+    async def _create_table(self, table_name: str = None):
+        """
+        Create the vector table, or another table with the same layout, storing the embeddings
+        with the configured vector type.
+        """
+        table_name = table_name or self.table_name
         await self.pg_engine.ainit_vectorstore_table(
-            table_name=self.table_name,
+            table_name=table_name,
             vector_size=self.config.vector_size,
             metadata_columns=self.metadata_columns
         )
-        
-        # Re-create the store
-        self.store = await PGVectorStore.create(
+        # The engine always creates a vector column; convert it while the table is still empty.
+        # Query vectors are cast to the column type by pgvector, so searches are unaffected.
+        if self.config.vector_type != "vector":
+            await self._execute(
+                f'ALTER TABLE "{table_name}" ALTER COLUMN "embedding" TYPE {self.config.vector_type}({self.config.vector_size})'
+            )
+
+    @staticmethod
+    def _index_name(table_name: str) -> str:
+        return f"{table_name}_embedding_ip_idx"
+
+    def _create_index_statement(self, table_name: str) -> str:
+        """
+        Statement creating the HNSW index on the embeddings of a table, with the configured parameters.
+        The embeddings are unit vectors, for which the inner product ranks like the cosine similarity
+        and is cheaper to compute.
+        """
+        return (
+            f'CREATE INDEX IF NOT EXISTS "{self._index_name(table_name)}" ON "{table_name}" '
+            f'USING hnsw ("embedding" {self.config.vector_type}_ip_ops) '
+            f'WITH (m = {self.config.hnsw_m}, ef_construction = {self.config.hnsw_ef_construction})'
+        )
+
+    async def _create_store(self):
+        """
+        Create the langchain store over the current table.
+        """
+        self._tuned_stores = OrderedDict()
+        self.store = await self._new_store(self.config.hnsw_ef_search)
+
+    async def _new_store(self, ef_search: int) -> PGVectorStore:
+        """
+        Create a langchain store over the current table, searching with the given HNSW ef_search.
+        """
+        return await PGVectorStore.create(
             engine=self.pg_engine,
             table_name=self.table_name,
             embedding_service=self.embeddings,
-            metadata_columns=[col['name'] for col in self.metadata_columns] if self.metadata_columns else None
+            metadata_columns=self._metadata_names or None,
+            # Searches order by the <#> negative inner product ascending, the order the HNSW index
+            # built with the ip_ops operator class can return rows in
+            distance_strategy=DistanceStrategy.INNER_PRODUCT,
+            # Set for each search, a larger candidate list than pgvector's default 40 gives better recall
+            index_query_options=HNSWQueryOptions(ef_search=ef_search)
         )
 
-    async def add_dataframe(self, df: pd.DataFrame):
+    async def _execute(self, query: str):
+        """
+        Execute a single statement on a dedicated connection and commit it.
+        """
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            await conn.execute(query)
+
+    async def truncate_store(self):
+        """
+        Truncate the vector store table - clears all data while preserving the table structure.
+        Refreshes go through replace_dataframe instead, which keeps the table readable meanwhile.
+        """
+        await self._execute(f'TRUNCATE TABLE "{self.table_name}"')
+
+    async def add_dataframe(self, df: pd.DataFrame, batch_size: int = 64):
+        """
+        Embed and add the rows of a DataFrame in batches of `batch_size` rows, so the embeddings are
+        computed for many rows at once while the memory held by one batch stays bounded.
+        """
         # Use the content_column that was set during initialization
-        for _, row in df.iterrows():
-            doc = Document(
-                id=str(uuid.uuid4()),
-                page_content=row[self.content_column],
-                metadata={col['name']: row[col['name']] for col in self.metadata_columns if col['name'] in row} if self.metadata_columns else {}
+        metadata_names = [name for name in self._metadata_names if name in df.columns]
+        for start in range(0, len(df), batch_size):
+            batch = df.iloc[start:start + batch_size]
+            contents = batch[self.content_column].tolist()
+            metadatas = batch[metadata_names].to_dict(orient='records') if metadata_names else [{} for _ in contents]
+            # The id column is a uuid, which Postgres parses from the plain hex form as well
+            ids = [uuid.uuid4().hex for _ in contents]
+            docs = [
+                Document(id=doc_id, page_content=content, metadata=metadata)
+                for doc_id, content, metadata in zip(ids, contents, metadatas)
+            ]
+            await self.store.aadd_documents(docs, ids=ids)
+
+    async def bulk_copy_dataframe(self, df: pd.DataFrame, embeddings_matrix: np.ndarray):
+        """
+        Load a DataFrame into the table with a single binary COPY stream.
+        Row i of `embeddings_matrix` is the precomputed embedding of row i of `df`,
+        so no embedding or per-row INSERT happens here.
+        """
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            await register_vector_async(conn)
+            await self._copy_dataframe(conn, self.table_name, df, embeddings_matrix)
+
+    async def bulk_add_dataframe(self, df: pd.DataFrame):
+        """
+        Embed all rows of a DataFrame in one batched call and load them with a single binary COPY,
+        for frames too large for the INSERT batches of add_dataframe.
+        """
+        contents = df[self.content_column].tolist()
+        embeddings_matrix = np.asarray(await asyncio.to_thread(self.embeddings.embed_documents, contents), dtype=np.float32)
+        await self.bulk_copy_dataframe(df, embeddings_matrix)
+
+    async def replace_dataframe(self, df: pd.DataFrame, embeddings_matrix: np.ndarray):
+        """
+        Replace the whole content of the table with a DataFrame and its precomputed embeddings.
+        The rows are loaded into an unlogged staging table which is then swapped in, in a single
+        transaction, so the current table keeps serving searches until the new one is complete.
+        The new table is laid out as configured, and the indexes of the replaced table are dropped with it.
+        """
+        stage_name = f"{self.table_name}_stage"
+        await self._execute(f'DROP TABLE IF EXISTS "{stage_name}"')
+        await self._create_table(stage_name)
+
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            await register_vector_async(conn)
+            # Rows copied into an unlogged table are not WAL-logged one record at a time
+            await conn.execute(f'ALTER TABLE "{stage_name}" SET UNLOGGED')
+            await self._copy_dataframe(conn, stage_name, df, embeddings_matrix)
+            # Logged again before the swap, so the served table survives a crash. SET LOGGED rewrites
+            # the whole table into the WAL, so the load is still WAL-logged once; the saving is only the
+            # per-row record overhead of the COPY. Done before building the index, which it would rewrite too.
+            await conn.execute(f'ALTER TABLE "{stage_name}" SET LOGGED')
+            # Build the index once over the loaded rows, instead of updating the graph row by row
+            await conn.execute(f"SET LOCAL maintenance_work_mem = '{self.config.index_maintenance_work_mem}'")
+            await conn.execute(self._create_index_statement(stage_name))
+            await conn.execute(f'DROP TABLE IF EXISTS "{self.table_name}"')
+            await conn.execute(f'ALTER TABLE "{stage_name}" RENAME TO "{self.table_name}"')
+            # Free the staging names for the next refresh
+            await conn.execute(f'ALTER INDEX "{stage_name}_pkey" RENAME TO "{self.table_name}_pkey"')
+            await conn.execute(f'ALTER INDEX "{self._index_name(stage_name)}" RENAME TO "{self._index_name(self.table_name)}"')
+        # Committed when the connection block exits
+
+        self.needs_rebuild = False
+        await self._create_store()
+
+    async def find_rows(self) -> List[Dict[str, Any]]:
+        """
+        Return every row of the table in the same shape as find_content, without the embeddings.
+        """
+        columns = ", ".join(f'"{name}"' for name in ["content"] + self._metadata_names)
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            cur = await conn.execute(f'SELECT {columns} FROM "{self.table_name}"')
+            rows = await cur.fetchall()
+        return [{"content": row[0], "metadata": dict(zip(self._metadata_names, row[1:]))} for row in rows]
+
+    async def find_embeddings(self, contents: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Return the stored embeddings of the given contents, for the contents the table holds.
+        """
+        if not contents:
+            return {}
+        async with await psycopg.AsyncConnection.connect(self.copy_conninfo) as conn:
+            await register_vector_async(conn)
+            cur = await conn.execute(
+                f'SELECT "content", "embedding" FROM "{self.table_name}" WHERE "content" = ANY(%s)',
+                (list(contents),)
             )
-            await self.store.aadd_documents([doc])
+            rows = await cur.fetchall()
+        # vector columns load as float32 arrays, halfvec columns as HalfVector
+        return {
+            content: (embedding.to_numpy() if isinstance(embedding, HalfVector) else embedding).astype(np.float32)
+            for content, embedding in rows
+        }
+
+    async def _copy_dataframe(self, conn: psycopg.AsyncConnection, table_name: str, df: pd.DataFrame, embeddings_matrix: np.ndarray):
+        """
+        Stream the rows of a DataFrame and their embeddings into a table with binary COPY.
+        """
+        if len(df) != len(embeddings_matrix):
+            raise ValueError(f"Got {len(embeddings_matrix)} embeddings for {len(df)} rows")
+
+        metadata_columns = [col for col in self.metadata_columns if col['name'] in df.columns] if self.metadata_columns else []
+        metadata_names = [col['name'] for col in metadata_columns]
+        # Same column layout as created by PGEngine.ainit_vectorstore_table
+        columns = ["langchain_id", "content", "embedding"] + metadata_names
+        types = ["uuid", "text", self.config.vector_type] + [col['data_type'] for col in metadata_columns]
+        column_list = ", ".join(f'"{col}"' for col in columns)
+
+        if self.config.vector_type == "halfvec":
+            embeddings_matrix = embeddings_matrix.astype(np.float16)
 
-    async def find_content(self, content: str, top_k: int, filter: dict = None) -> List[Dict[str, Any]]:
+        # Read every column out once as a plain list, so rows are zipped from lists rather than
+        # materialized through an object-dtype copy of the frame; missing values become NULL instead of NaN
+        metadata_values = []
+        for name in metadata_names:
+            column = df[name]
+            values = column.tolist()
+            if column.hasnans:
+                values = [None if missing else value for value, missing in zip(values, column.isna().tolist())]
+            metadata_values.append(values)
+
+        async with conn.cursor() as cur:
+            async with cur.copy(f'COPY "{table_name}" ({column_list}) FROM STDIN WITH (FORMAT BINARY)') as copy:
+                copy.set_types(types)
+                for content, embedding, *row in zip(df[self.content_column].tolist(), embeddings_matrix, *metadata_values):
+                    await copy.write_row((uuid.uuid4(), content, embedding, *row))
+
+    async def find_content(self, content: str, top_k: int, filter: dict = None, ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Find the `top_k` rows most similar to `content`. `ef_search` overrides the configured HNSW
+        candidate list size for this search, lower values are faster and higher values give better recall.
+        """
+        if ef_search is not None and not top_k <= ef_search <= MAX_EF_SEARCH:
+            # The index returns at most ef_search rows, fewer than top_k would silently truncate the results
+            raise ValueError(f"ef_search must be between top_k ({top_k}) and {MAX_EF_SEARCH}, got {ef_search}")
         # Query the database for similar vectors
-        docs = await self.store.asimilarity_search(content, k=top_k, filter=filter)
+        embedding = await self._embed_query(content)
+        store = await self._store_for(ef_search)
+        docs = await store.asimilarity_search_by_vector(embedding, k=top_k, filter=filter)
 
         return [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
 
+    async def _store_for(self, ef_search: Optional[int]) -> PGVectorStore:
+        """
+        Return the store searching with the given ef_search, the default store when it is not given.
+        The store sets it with SET LOCAL in the transaction running the search, so it does not leak
+        to other searches on the pooled connection. The stores of the most recently used values are kept.
+        """
+        if ef_search is None or ef_search == self.config.hnsw_ef_search:
+            return self.store
+        ef_search = int(ef_search)
+        store = self._tuned_stores.get(ef_search)
+        if store is not None:
+            self._tuned_stores.move_to_end(ef_search)
+            return store
+        store = self._tuned_stores[ef_search] = await self._new_store(ef_search)
+        if len(self._tuned_stores) > MAX_TUNED_STORES:
+            self._tuned_stores.popitem(last=False)
+        return store
+
+    async def _embed_query(self, content: str) -> List[float]:
+        """
+        Embed a search query, reusing the embedding computed for a recent identical query.
+        """
+        embedding = self._query_embeddings.get(content)
+        if embedding is not None:
+            self._query_embeddings.move_to_end(content)
+            return embedding
+
+        # The model call is synchronous and CPU bound; run it in a worker thread explicitly
+        # rather than relying on the embeddings class to implement aembed_query without blocking
+        embedding = await asyncio.to_thread(self.embeddings.embed_query, content)
+        self._query_embeddings[content] = embedding
+        if len(self._query_embeddings) > self.config.query_embedding_cache_size:
+            self._query_embeddings.popitem(last=False)
+        return embedding
 
     async def drop(self):
         """
@@ -88,6 +400,7 @@ class VectorStore:
         """
         await self.pg_engine.adrop_table(table_name=self.table_name)
         self.store = None
+        self._tuned_stores = OrderedDict()
         
     async def close(self):
         """